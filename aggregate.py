@@ -0,0 +1,96 @@
+"""
+Server-side aggregation of the chart data.
+
+Drawing one mark per section stops working once the dataset holds the whole statute book. Above
+`AGGREGATE_THRESHOLD` sections, the Graph Explorer draws the bins computed here instead: a density of sections for
+scatter plots and quantiles of the score for the ordered bar charts. Every bin keeps an example section and its `url`,
+so a bin still links to the Section Explorer.
+"""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from metrics import Metric
+
+# Number of sections above which the charts are drawn from aggregated data.
+AGGREGATE_THRESHOLD = int(os.environ.get("PLUS_AGGREGATE_THRESHOLD", 2000))
+
+
+def bin_edges(values: np.ndarray, bins: int = 50, step: float | None = None) -> np.ndarray:
+    """
+    Returns the edges of the bins for `values`.
+    :param values: Finite values to bin.
+    :param bins: Number of bins of equal width, if `step` is not given.
+    :param step: Width of every bin. The edges are multiples of `step`.
+    """
+    if step:
+        start = np.floor(values.min() / step) * step
+        stop = np.floor(values.max() / step) * step + step
+        return np.arange(start, stop + step / 2, step)
+    return np.histogram_bin_edges(values, bins=bins)
+
+
+def _codes(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    return np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+
+
+def density(frame: pd.DataFrame, x: str, y: str, x_bins: int = 50, y_bins: int = 50,
+            x_step: float | None = None, y_step: float | None = None) -> pd.DataFrame:
+    """
+    Counts the sections in `frame` falling in every bin of a grid over columns `x` and `y`.
+    :param frame: Chart data, with an `index` and a `url` column.
+    :param x: Column for the horizontal axis.
+    :param y: Column for the vertical axis.
+    :return: One row per non-empty bin, with the bounds of the bin (`x_start`, `x_end`, `y_start`, `y_end`),
+        the number of sections in it (`count`), and the `index` and `url` of the first section in it.
+    """
+    values = frame[[x, y, "index", "url"]].dropna(subset=[x, y])
+    x_values, y_values = values[x].to_numpy(dtype=float), values[y].to_numpy(dtype=float)
+    if not len(values):
+        return pd.DataFrame(columns=["x_start", "x_end", "y_start", "y_end", "count", "index", "url"])
+    x_edges, y_edges = bin_edges(x_values, x_bins, x_step), bin_edges(y_values, y_bins, y_step)
+    codes = pd.DataFrame({"x_code": _codes(x_values, x_edges), "y_code": _codes(y_values, y_edges),
+                          "index": values["index"].to_numpy(), "url": values["url"].to_numpy()})
+    bins = codes.groupby(["x_code", "y_code"], sort=False).agg(
+        count=("index", "size"), index=("index", "first"), url=("url", "first")).reset_index()
+    bins["x_start"], bins["x_end"] = x_edges[bins["x_code"]], x_edges[bins["x_code"] + 1]
+    bins["y_start"], bins["y_end"] = y_edges[bins["y_code"]], y_edges[bins["y_code"] + 1]
+    return bins[["x_start", "x_end", "y_start", "y_end", "count", "index", "url"]]
+
+
+def quantiles(frame: pd.DataFrame, metric: Metric, buckets: int = 100, ascending: bool = True) -> pd.DataFrame:
+    """
+    Splits the sections in `frame` into `buckets` groups of equal size, ordered by their current score in `metric`.
+    :param frame: Chart data, with an `index` and a `url` column.
+    :param metric: The metric to order sections by.
+    :param buckets: Number of groups.
+    :param ascending: Whether the first group holds the lowest scores.
+    :return: One row per group, with its position (`quantile`), the number of sections in it (`count`), the mean
+        previous, current and diff score of its sections, the range of the current score (`current_min`,
+        `current_max`), and the `index` and `url` of its median section.
+    """
+    values = frame[[metric.previous_column, metric.current_column, metric.diff_column, "index", "url"]] \
+        .dropna(subset=[metric.current_column]) \
+        .sort_values(metric.current_column, ascending=ascending, kind="stable")
+    total = len(values)
+    if not total:
+        return pd.DataFrame(columns=["quantile", "count", "previous_mean", "current_mean", "diff_mean",
+                                     "current_min", "current_max", "index", "url"])
+    values["quantile"] = np.arange(total) * min(buckets, total) // total
+    grouped = values.groupby("quantile", sort=True)
+    result = grouped.agg(
+        count=("index", "size"),
+        previous_mean=(metric.previous_column, "mean"),
+        current_mean=(metric.current_column, "mean"),
+        diff_mean=(metric.diff_column, "mean"),
+        current_min=(metric.current_column, "min"),
+        current_max=(metric.current_column, "max"),
+    )
+    starts = np.concatenate([[0], np.cumsum(result["count"].to_numpy())[:-1]])
+    median = starts + result["count"].to_numpy() // 2
+    result["index"] = values["index"].to_numpy()[median]
+    result["url"] = values["url"].to_numpy()[median]
+    return result.reset_index()
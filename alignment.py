@@ -0,0 +1,334 @@
+"""
+Sentence-level alignment of the previous and current text of every section.
+
+The dataset scores every section as a whole, so a long section hides which of its sentences became easier or harder
+to read. This module splits both texts of a section into sentences and aligns them with the opcodes of the redline
+diff: two sentences are aligned if at least `LINK_SHARE` of the tokens of one of them are unchanged in the other.
+Since the opcodes never cross, sentences aligned with each other form runs, so a sentence split into two, or two
+sentences merged into one, are aligned as a group. Sentences aligned with nothing were deleted or inserted.
+
+Every aligned group is scored with the metrics of the dataset (see `metrics.METRICS`), as the `previous_<key>` and
+`current_<key>` columns of a child table with one row per group, in the order of the text. The table only holds
+numbers: the text of a group is read from the section by its character offsets. It is stored column by column, in
+the order of the rows of the dataset, with `sentences.offsets.npy` giving where the rows of every section start:
+
+* `sentences.tag.npy`, the index in `TAGS` of how the group changed;
+* `sentences.previous_start.npy`, `sentences.previous_end.npy`, `sentences.current_start.npy` and
+  `sentences.current_end.npy`, the character offsets of the group in both texts; and
+* `sentences.<column>.npy`, every score as float32, NaN on the side of a deleted or inserted sentence.
+
+`python store.py --sentences` writes these files along with the store, and they are memory-mapped on load.
+Scoring the sentences needs the `notebook` extras, which the apps do not: without the files, the Section Explorer
+can only show the sentences of a section if the extras are installed.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_PATH, load_dataset, memoize
+from ipynb.helpers import tokenizer
+from metrics import METRICS, add_deltas
+from store import STORE_PATH, TEXT_COLUMNS, open_store
+
+# How every aligned group of sentences changed. Stored as the index of the tag.
+TAGS = ("equal", "replace", "delete", "insert")
+
+# Share of the tokens of the shorter of two sentences which must be unchanged for them to be aligned.
+LINK_SHARE = 0.5
+
+# The end of a sentence, as `readability.sentence_separator` splits sentences.
+sentence_end = re.compile(r"[.?!]['\")\]]*[ \n]+(?=[A-Z])")
+
+# Records which version of the dataset the table was built from. It is written last, so a table without it is
+# incomplete.
+SENTENCES_META_FILE = "sentences.json"
+
+OFFSET_COLUMNS = ("previous_start", "previous_end", "current_start", "current_end")
+
+SCORE_COLUMNS = tuple(column for metric in METRICS.values() for column in (metric.previous_column,
+                                                                           metric.current_column))
+
+
+def sentence_bounds(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits `text` into sentences.
+    :return: The character offsets where every sentence starts, followed by the length of `text`, and the sentence of
+        every token of `tokenize_text`.
+    """
+    starts = np.array([match.start() for match in tokenizer.finditer(text)], dtype=np.int64)
+    if not len(starts):
+        return np.array([len(text)], dtype=np.int64), starts
+    ends = np.array([match.end() for match in sentence_end.finditer(text)], dtype=np.int64)
+    bounds = np.concatenate([[0], ends, [len(text)]])
+    return bounds, np.searchsorted(ends, starts, side="right")
+
+
+def _unchanged_tokens(opcodes: list[tuple[str, int, int, int, int]]) -> tuple[np.ndarray, np.ndarray]:
+    equal = np.array([opcode[1:] for opcode in opcodes if opcode[0] == "equal"], dtype=np.int64).reshape(-1, 4)
+    lengths = equal[:, 1] - equal[:, 0]
+    steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(equal[:, 0], lengths) + steps, np.repeat(equal[:, 2], lengths) + steps
+
+
+def align(previous: str, current: str, opcodes: list[tuple[str, int, int, int, int]]) -> dict[str, np.ndarray]:
+    """
+    Aligns the sentences of `previous` and `current`.
+    :param opcodes: The opcodes of the redline diff of `previous` and `current` (see `diffs.Diff`).
+    :return: The `tag` and the `OFFSET_COLUMNS` of every aligned group of sentences, in the order of the text.
+        The offsets of a deleted group in the current text, and of an inserted group in the previous text, are the
+        empty span where it would be.
+    """
+    previous_bounds, previous_sentences = sentence_bounds(previous)
+    current_bounds, current_sentences = sentence_bounds(current)
+    previous_count, current_count = len(previous_bounds) - 1, len(current_bounds) - 1
+
+    # Sentences sharing enough unchanged tokens, ordered by previous then current sentence.
+    previous_tokens, current_tokens = _unchanged_tokens(opcodes)
+    links, shared = np.unique(previous_sentences[previous_tokens] * max(current_count, 1)
+                              + current_sentences[current_tokens], return_counts=True)
+    linked_previous, linked_current = np.divmod(links, max(current_count, 1))
+    shorter = np.minimum(np.bincount(previous_sentences, minlength=previous_count)[linked_previous],
+                         np.bincount(current_sentences, minlength=current_count)[linked_current])
+    keep = shared >= LINK_SHARE * shorter
+    linked_previous, linked_current = linked_previous[keep], linked_current[keep]
+
+    # A group starts wherever both sentences of a link follow those of the one before it.
+    groups = np.zeros((0, 4), dtype=np.int64)
+    if len(linked_previous):
+        starts = np.flatnonzero(np.concatenate([[True], (np.diff(linked_previous) > 0)
+                                                & (np.diff(linked_current) > 0)]))
+        groups = np.stack([np.minimum.reduceat(linked_previous, starts),
+                           np.maximum.reduceat(linked_previous, starts) + 1,
+                           np.minimum.reduceat(linked_current, starts),
+                           np.maximum.reduceat(linked_current, starts) + 1], axis=1)
+    tags = np.ones(len(groups), dtype=np.int8)
+
+    # Sentences outside every group, with the group before which they go.
+    rows = [groups]
+    for side, count in ((0, previous_count), (2, current_count)):
+        covered = np.zeros(count + 1, dtype=np.int64)
+        np.add.at(covered, groups[:, side], 1)
+        np.add.at(covered, groups[:, side + 1], -1)
+        alone = np.flatnonzero(np.cumsum(covered)[:count] == 0)
+        other = np.append(groups[:, 2 - side], current_count if side == 0 else previous_count)[
+            np.searchsorted(groups[:, side], alone)]
+        group = np.empty((len(alone), 4), dtype=np.int64)
+        group[:, side], group[:, side + 1] = alone, alone + 1
+        group[:, 2 - side] = group[:, 3 - side] = other
+        rows.append(group)
+        tags = np.concatenate([tags, np.full(len(alone), TAGS.index("delete" if side == 0 else "insert"),
+                                             dtype=np.int8)])
+    groups = np.concatenate(rows)
+    order = np.lexsort((tags == TAGS.index("insert"), groups[:, 2], groups[:, 0]))
+    groups, tags = groups[order], tags[order]
+
+    offsets = np.stack([previous_bounds[groups[:, 0]], previous_bounds[groups[:, 1]],
+                        current_bounds[groups[:, 2]], current_bounds[groups[:, 3]]], axis=1)
+    result = {"tag": tags}
+    result.update({column: offsets[:, position].astype(np.int32) for position, column in enumerate(OFFSET_COLUMNS)})
+    return result
+
+
+def _span(text: str, start: int, end: int) -> str:
+    return text[start:end].strip()
+
+
+def score_alignments(texts: list[tuple[str, str]], alignments: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    """
+    Scores every aligned group of sentences, and marks the groups whose text is unchanged as "equal".
+    Every distinct text is scored once, however many groups and sections it appears in. Scoring needs the `notebook`
+    extras (see `readability.py`).
+    :param texts: The previous and current text of every section.
+    :param alignments: The result of `align` for every section.
+    :return: The columns of the child table of every section, end to end.
+    """
+    from readability import score_text
+
+    table = {column: np.concatenate([alignment[column] for alignment in alignments])
+             if alignments else np.zeros(0, dtype=np.int32) for column in ("tag",) + OFFSET_COLUMNS}
+    table["tag"] = table["tag"].astype(np.int8)
+    spans = {version: [_span(text_pair[position], start, end)
+                       for text_pair, alignment in zip(texts, alignments)
+                       for start, end in zip(alignment[f"{version}_start"].tolist(),
+                                             alignment[f"{version}_end"].tolist())]
+             for position, version in enumerate(TEXT_COLUMNS)}
+    table["tag"][(table["tag"] == TAGS.index("replace"))
+                 & (np.array(spans["previous"], dtype=object) == np.array(spans["current"], dtype=object))] = \
+        TAGS.index("equal")
+
+    distinct = {}
+    for text in spans["previous"] + spans["current"]:
+        if text and text not in distinct:
+            distinct[text] = len(distinct)
+    scores = np.full((len(distinct) + 1, len(METRICS)), np.nan, dtype=np.float32)
+    for text, position in distinct.items():
+        text_scores = score_text(text)
+        scores[position] = [text_scores[key] for key in METRICS]
+    for version in TEXT_COLUMNS:
+        rows = scores[[distinct.get(text, len(distinct)) for text in spans[version]]]
+        for position, metric in enumerate(METRICS.values()):
+            table[getattr(metric, f"{version}_column")] = rows[:, position]
+    return table
+
+
+def build_sentence_table(frame: pd.DataFrame) -> SentenceTable:
+    """
+    Aligns and scores the sentences of every section of `frame`, diffing them as in `diffs.precompute_diffs`.
+    :param frame: The dataset, with the `previous` and `current` text of every section.
+    """
+    from diffs import compute_diff
+    from ipynb.helpers import Vocabulary
+
+    vocabulary = Vocabulary()
+    texts = list(zip(frame["previous"].fillna(""), frame["current"].fillna("")))
+    alignments = [align(previous, current, compute_diff(previous, current, vocabulary).opcodes)
+                  for previous, current in texts]
+    offsets = np.concatenate([[0], np.cumsum([len(alignment["tag"]) for alignment in alignments])])
+    return SentenceTable(frame.index.astype(str).tolist(), offsets, score_alignments(texts, alignments))
+
+
+def _file(store_path: str, name: str) -> str:
+    return os.path.join(store_path, f"sentences.{name}.npy")
+
+
+def write_sentence_table(store) -> int:
+    """
+    Aligns and scores the sentences of every section of `store` and writes the table along with it.
+    :param store: A `store.ColumnStore`.
+    :return: The number of rows of the table.
+    """
+    meta_path = os.path.join(store.path, SENTENCES_META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    table = build_sentence_table(store.frame(list(TEXT_COLUMNS)))
+    np.save(_file(store.path, "offsets"), table.offsets)
+    for column, values in table.columns.items():
+        np.save(_file(store.path, column), values)
+    with open(meta_path, "w", encoding="utf-8") as file:
+        json.dump({"source_version": store.meta["source_version"]}, file)
+    return len(table)
+
+
+class SentenceTable:
+    """The aligned sentences of every section, and their scores."""
+
+    def __init__(self, keys: list[str], offsets: np.ndarray, columns: dict[str, np.ndarray]):
+        """
+        :param keys: The key of every section, in the order of the rows of the dataset.
+        :param offsets: The rows of section i are the rows offsets[i]:offsets[i + 1] of the columns.
+        :param columns: The `tag`, the `OFFSET_COLUMNS` and the `SCORE_COLUMNS` of every row.
+        """
+        self.keys = keys
+        self.offsets = offsets
+        self.columns = columns
+        self._positions: dict[str, int] = {}
+        for position, key in enumerate(keys):
+            self._positions.setdefault(key, position)
+
+    @classmethod
+    def open(cls, store) -> SentenceTable | None:
+        """Returns the table written along with `store`, or None if there is none or it is out of date."""
+        meta_path = os.path.join(store.path, SENTENCES_META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as file:
+            if json.load(file)["source_version"] != store.meta["source_version"]:
+                return None
+        columns = {column: np.load(_file(store.path, column), mmap_mode="r")
+                   for column in ("tag",) + OFFSET_COLUMNS + SCORE_COLUMNS}
+        return cls(store.index.astype(str).tolist(), np.load(_file(store.path, "offsets"), mmap_mode="r"), columns)
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Returns every row of the table, with the key of its section as the `index` column, its `tag` and the change in
+        every metric as `diff_` columns.
+        """
+        sections = np.repeat(np.arange(len(self.keys)), np.diff(self.offsets))
+        frame = pd.DataFrame({column: np.asarray(values) for column, values in self.columns.items()})
+        frame.insert(0, "index", np.array(self.keys, dtype=object)[sections])
+        frame["tag"] = pd.Categorical.from_codes(frame["tag"], TAGS)
+        return add_deltas(frame)
+
+    def section(self, key: str, previous: str, current: str) -> pd.DataFrame:
+        """
+        Returns the aligned sentences of the section `key`, in the order of the text.
+        :param previous: The previous text of the section, which the offsets of its rows refer to.
+        :param current: The current text of the section.
+        :return: One row per aligned group with its `tag`, its `previous` and `current` text, their scores and the
+            change in every metric as `diff_` columns.
+        """
+        position = self._positions[key]
+        rows = slice(int(self.offsets[position]), int(self.offsets[position + 1]))
+        return section_frame({column: np.asarray(values[rows]) for column, values in self.columns.items()},
+                             previous, current)
+
+
+def section_frame(columns: dict[str, np.ndarray], previous: str, current: str) -> pd.DataFrame:
+    """Returns the rows of one section of the table, as described in `SentenceTable.section`."""
+    frame = pd.DataFrame({"tag": pd.Categorical.from_codes(columns["tag"], TAGS),
+                          "previous": [_span(previous, start, end) for start, end in
+                                       zip(columns["previous_start"].tolist(), columns["previous_end"].tolist())],
+                          "current": [_span(current, start, end) for start, end in
+                                      zip(columns["current_start"].tolist(), columns["current_end"].tolist())]})
+    for column in SCORE_COLUMNS:
+        frame[column] = columns[column].astype(np.float64)
+    return add_deltas(frame)
+
+
+def align_texts(previous: str, current: str) -> pd.DataFrame:
+    """Aligns and scores the sentences of two texts which are not in the table, as `SentenceTable.section` does."""
+    from diffs import get_diff
+
+    alignment = align(previous, current, get_diff(previous, current).opcodes)
+    return section_frame(score_alignments([(previous, current)], [alignment]), previous, current)
+
+
+def _load_sentence_table(path: str) -> SentenceTable:
+    store = open_store(path, STORE_PATH)
+    table = SentenceTable.open(store) if store is not None else None
+    if table is None:
+        table = build_sentence_table(load_dataset(path, list(TEXT_COLUMNS)))
+    return table
+
+
+def sentence_table(path: str = DATA_PATH) -> SentenceTable:
+    """
+    Returns the aligned sentences of the dataset at `path`.
+    The table written with the store is used if the store is up to date. Otherwise the table is built in memory,
+    once per version of the dataset.
+    """
+    return memoize("sentence_table", lambda: _load_sentence_table(path), path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Align the sentences of the PLUS Explorer dataset.")
+    parser.add_argument("--data", default=DATA_PATH, help="Path to the dataset.")
+    parser.add_argument("--metric", default="gunning_fog", choices=list(METRICS))
+    parser.add_argument("--top", type=int, default=10, help="Number of sentences to show.")
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+    table = build_sentence_table(load_dataset(arguments.data, list(TEXT_COLUMNS)))
+    print(f"{len(table)} aligned sentences of {len(table.keys)} sections in {time.perf_counter() - start:.1f}s")
+    rows = table.frame()
+    changed = rows[rows["tag"] == "replace"]
+    print(rows["tag"].value_counts().to_string())
+    metric = METRICS[arguments.metric]
+    worse = changed[metric.diff_column] * (1 if metric.delta_color == "inverse" else -1)
+    print(f"Rewritten sentences which became harder to read by {metric.name}:")
+    print(changed.loc[worse.sort_values(ascending=False).index[:arguments.top],
+                      ["index", metric.previous_column, metric.current_column]].to_string())
@@ -0,0 +1,35 @@
+"""
+Times `clean_text` against its original five-pass version on every text of the dataset, also seen as raw text.
+`tests/test_clean_text.py` checks that both clean every text the same way.
+
+    python -m benchmarks.clean_text [--data data.csv.gz] [--repeat 3]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from dataset import DATA_PATH
+from ipynb.helpers import clean_text
+from tests.test_clean_text import dataset_texts, reference_clean_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=DATA_PATH, help='Path to the dataset.')
+    parser.add_argument('--repeat', type=int, default=3)
+    arguments = parser.parse_args()
+
+    texts = dataset_texts(arguments.data)
+    for name, function in (('reference', reference_clean_text), ('clean_text', clean_text)):
+        best = float('inf')
+        for _ in range(arguments.repeat):
+            start = time.perf_counter()
+            for text in texts:
+                function(text)
+            best = min(best, time.perf_counter() - start)
+        print(f'{name:>10}: {best * 1000:8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
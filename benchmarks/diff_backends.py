@@ -0,0 +1,56 @@
+"""
+Compares the diff backends of `Redlines` on the longest sections of the dataset, and on every section.
+
+    python -m benchmarks.diff_backends [--sections 10] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from dataset import load_dataset
+from ipynb.helpers import DIFF_BACKENDS, Redlines
+
+
+def time_backend(pairs: list[tuple[str, str]], backend: str, repeat: int) -> float:
+    """Returns the best time, in seconds, taken by `backend` to diff every pair in `pairs`."""
+    redlines = [Redlines(previous, current, backend=backend) for previous, current in pairs]
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for redline in redlines:
+            redline._opcodes = None
+            redline.opcodes
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sections', type=int, default=10, help='Number of longest sections to time separately.')
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    dataset = load_dataset(columns=['previous', 'current'])
+    lengths = dataset['previous'].str.len() + dataset['current'].str.len()
+    longest = dataset.loc[lengths.sort_values(ascending=False).index[:arguments.sections]]
+    longest = longest[~longest.index.duplicated()]
+
+    backends = list(DIFF_BACKENDS)
+    print(f"{'Section':60} {'Tokens':>7} " + " ".join(f"{backend:>10}" for backend in backends))
+    for key, row in longest.iterrows():
+        pair = [(row['previous'], row['current'])]
+        timings = [time_backend(pair, backend, arguments.repeat) for backend in backends]
+        tokens = len(Redlines(row['previous'])._seq1)
+        print(f"{key[:60]:60} {tokens:>7} " + " ".join(f"{timing * 1000:>8.2f}ms" for timing in timings))
+
+    pairs = list(zip(dataset['previous'], dataset['current']))
+    identical = sum(previous == current for previous, current in pairs)
+    timings = {backend: time_backend(pairs, backend, arguments.repeat) for backend in backends}
+    print(f"\nAll {len(pairs)} sections ({identical} unchanged):")
+    for backend, timing in timings.items():
+        print(f"{backend:>10}: {timing * 1000:8.2f}ms ({timings['difflib'] / timing:.1f}x difflib)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Times the hot paths of the apps and of the data pipeline, and writes the results as JSON.
+
+    python -m benchmarks.hot_paths [--data data.csv.gz] [--repeat 3] [--output results.json]
+    python -m benchmarks.hot_paths --compare before.json after.json
+
+Every benchmark is run `--repeat` times, and its best and mean time are recorded with the number of items it
+processed. The results also record the commit, the Python version and the size of the dataset, so runs on different
+commits can be compared with `--compare`. Use `benchmarks.synthetic` to time larger datasets.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from dataset import DATA_PATH
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(function, repeat: int) -> tuple[float, float]:
+    """Returns the best and the mean time, in seconds, of `repeat` calls to `function`."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def read_csv_cold(path: str) -> float:
+    """Returns the time taken by `pd.read_csv` in a new interpreter, which has never read the file."""
+    code = ("import sys, time; import pandas as pd; start = time.perf_counter(); "
+            "pd.read_csv(sys.argv[1], index_col=0); print(time.perf_counter() - start)")
+    output = subprocess.run([sys.executable, "-c", code, path], check=True, capture_output=True, text=True).stdout
+    return float(output)
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmarks(frame: pd.DataFrame, path: str):
+    """Yields the name, the function to time and the number of items processed of every benchmark."""
+    from charts import SCORE_CHARTS, WORD_COUNT, _spec, chart_spec
+    from ipynb.helpers import Redlines, Vocabulary, calculate_stats, clean_text, tokenize_text
+
+    pairs = list(zip(frame["previous"].fillna(""), frame["current"].fillna("")))
+    texts = [text for pair in pairs for text in pair]
+
+    yield "read_csv.warm", lambda: pd.read_csv(path, index_col=0), len(frame.index)
+    yield "tokenize_text", lambda: [tokenize_text(text) for text in texts], len(texts)
+
+    def opcodes():
+        for previous, current in pairs:
+            redline = Redlines(previous)
+            redline.test = current
+            redline.opcodes
+    yield "Redlines.opcodes", opcodes, len(pairs)
+
+    def interned_opcodes():
+        vocabulary = Vocabulary()
+        for previous, current in pairs:
+            redline = Redlines(previous, vocabulary=vocabulary)
+            redline.test = current
+            redline.opcodes
+    yield "Redlines.opcodes.interned", interned_opcodes, len(pairs)
+    yield "Redlines.output_markdown", lambda: [Redlines(*pair).output_markdown for pair in pairs], len(pairs)
+
+    yield "clean_text", lambda: [clean_text(text) for text in texts], len(texts)
+    yield "clean_text+calculate_stats", lambda: [calculate_stats(clean_text(text)) for text in texts], len(texts)
+    try:
+        from readability import score_text
+    except ImportError:
+        pass
+    else:
+        yield ("clean_text+readability.score_text", lambda: [score_text(clean_text(text)) for text in texts],
+               len(texts))
+
+    kinds = {key: ("change", "ordered") for key in SCORE_CHARTS}
+    kinds[WORD_COUNT.key] = ("change",)
+    for key, chart_kinds in kinds.items():
+        for kind in chart_kinds:
+            def build(key=key, kind=kind):
+                _spec.cache_clear()
+                chart_spec(key, kind)
+            yield f"chart.{key}.{kind}", build, 1
+
+
+def run(path: str = DATA_PATH, repeat: int = 3, only: list[str] | None = None) -> dict:
+    """
+    Runs every benchmark, or those whose name starts with one of `only`, on the dataset at `path`.
+    :return: The results, as written by `--output`.
+    """
+    frame = pd.read_csv(path, index_col=0)
+    results = []
+
+    def record(name: str, best: float, mean: float, items: int):
+        results.append({"name": name, "best": best, "mean": mean, "items": items,
+                        "items_per_second": items / best if best else None})
+        print(f"{name:45} {best * 1000:>10.2f}ms {mean * 1000:>10.2f}ms {items:>8}", flush=True)
+
+    print(f"{'Benchmark':45} {'Best':>12} {'Mean':>12} {'Items':>8}")
+    if not only or any("read_csv.cold".startswith(prefix) for prefix in only):
+        timings = [read_csv_cold(path) for _ in range(repeat)]
+        record("read_csv.cold", min(timings), sum(timings) / len(timings), len(frame.index))
+    for name, function, items in benchmarks(frame, path):
+        if not only or any(name.startswith(prefix) for prefix in only):
+            record(name, *measure(function, repeat), items)
+
+    return {
+        "commit": commit(),
+        "time": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "data": os.path.abspath(path),
+        "rows": len(frame.index),
+        "bytes": os.path.getsize(path),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(before: dict, after: dict):
+    """Prints the best time of every benchmark in two sets of results, and how much faster the second is."""
+    if before["rows"] != after["rows"]:
+        print(f"Warning: the results are for datasets of {before['rows']} and {after['rows']} rows.")
+    timings = {result["name"]: result["best"] for result in before["results"]}
+    print(f"{'Benchmark':45} {'Before':>12} {'After':>12} {'Speed-up':>9}")
+    for result in after["results"]:
+        previous = timings.get(result["name"])
+        if previous is not None:
+            print(f"{result['name']:45} {previous * 1000:>10.2f}ms {result['best'] * 1000:>10.2f}ms "
+                  f"{previous / result['best']:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DATA_PATH, help="Path to the dataset, such as a synthetic one.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="Run only the benchmarks whose name starts with these.")
+    parser.add_argument("--output", help="Path to write the results to, as JSON.")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two results files.")
+    arguments = parser.parse_args()
+
+    if arguments.compare:
+        results = []
+        for path in arguments.compare:
+            with open(path, encoding="utf-8") as file:
+                results.append(json.load(file))
+        compare(*results)
+        return
+
+    results = run(arguments.data, arguments.repeat, arguments.only)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Writes a synthetic dataset many times the size of `data.csv.gz`, made of copies of its rows.
+
+Every copy of a row gets a new key, Act name and explorer link, so the copies of a section look like sections of
+different Acts. The rows are written a copy at a time, so the dataset never has to fit in
+memory.
+
+    python -m benchmarks.synthetic 100 [--output data_100x.csv.gz]
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+from urllib.parse import urlencode
+
+import pandas as pd
+
+from dataset import DATA_PATH
+
+
+def synthetic_copy(frame: pd.DataFrame, copy: int) -> pd.DataFrame:
+    """Returns the rows of `frame` renamed as copy number `copy`. Copy 0 is `frame` itself."""
+    if not copy:
+        return frame
+    frame = frame.copy()
+    frame['act_name'] = frame['act_name'] + f' (Copy {copy})'
+    frame.index = [f'{key} (Copy {copy})' for key in frame.index]
+    frame.index.name = 'index'
+    frame['url'] = [url.split('?')[0] + '?' + urlencode({'section': key})
+                    for url, key in zip(frame['url'], frame.index)]
+    return frame
+
+
+def synthesize(scale: int, output: str, source: str = DATA_PATH) -> int:
+    """
+    Writes `scale` copies of the dataset at `source` to `output`.
+    :return: The number of rows written.
+    """
+    frame = pd.read_csv(source, index_col=0)
+    with gzip.open(output, 'wt', encoding='utf-8', newline='') as file:
+        for copy in range(scale):
+            synthetic_copy(frame, copy).to_csv(file, header=copy == 0)
+    return scale * len(frame.index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scale', type=int, help='Number of copies of the dataset, such as 10, 100 or 1000.')
+    parser.add_argument('--output', help='Path to write to. Defaults to data_<scale>x.csv.gz.')
+    parser.add_argument('--source', default=DATA_PATH)
+    arguments = parser.parse_args()
+    output = arguments.output or f'data_{arguments.scale}x.csv.gz'
+    print(f'{synthesize(arguments.scale, output, arguments.source)} rows written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+"""
+Vega-Lite charts of the Graph Explorer.
+
+The specs do not contain any data. They refer to the columns of a single frame (see `chart_data`), which is passed
+alongside the spec, so a spec is built once and reused whatever the size of the dataset. Only the columns which a
+spec refers to are passed with it.
+Above `aggregate.AGGREGATE_THRESHOLD` sections, `chart_view` returns charts of binned data instead
+(see `aggregate.py`).
+`dashboard_view` draws every metric at once from the same frame, in charts linked by a selection in the browser.
+The rewrite patterns mined by `patterns.py` are drawn from their own frame (see `pattern_view`).
+The compiled specs in `vega_source/` are generated from the same code:
+
+    python charts.py [--output vega_source] [--data-url sections.json]
+"""
+from __future__ import annotations
+
+import json
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+import altair as alt
+import pandas as pd
+
+from aggregate import AGGREGATE_THRESHOLD, density, quantiles
+from dataset import DATA_PATH, load_dataset, memoize
+from metrics import METRICS, Metric
+
+DATASET_NAME = "sections"
+
+PATTERNS_DATASET_NAME = "patterns"
+
+# Name of the selection of sections in the linked charts of `dashboard_chart`.
+BRUSH_NAME = "sections_brush"
+
+VEGA_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vega_source")
+
+
+class ScoreChart(NamedTuple):
+    metric: Metric
+    # Keyword arguments of the `alt.Scale` used to colour the change in score.
+    scale: dict
+    # Sort order of the change in score, and of the sections in the ordered chart.
+    change_sort: str
+    order_sort: str
+    # Positions of the horizontal rules in the change chart, and of the vertical rules in the ordered chart.
+    change_rules: tuple[str, ...]
+    score_rules: tuple[str, ...]
+    # Whether the rules of the ordered chart are drawn over the bars.
+    rules_over_bars: bool = False
+    # Whether the change chart has a title for its colour legend.
+    change_legend_title: bool = False
+
+    @property
+    def title(self) -> str:
+        return f"Change in {self.metric.abbreviation}"
+
+
+SCORE_CHARTS = {chart.metric.key: chart for chart in (
+    ScoreChart(METRICS["flesch_reading_ease"],
+               dict(scheme='pinkyellowgreen', domainMid=0, domainMin=-10, domainMax=10),
+               '-y', '-x', ('5', '-5'), ('50', '10'), rules_over_bars=True),
+    ScoreChart(METRICS["gunning_fog"],
+               dict(scheme='pinkyellowgreen', domainMid=0, domainMin=-2, domainMax=2, reverse=True),
+               'descending', 'x', ('0.5', '-0.5'), ('12',)),
+    ScoreChart(METRICS["ari"], dict(scheme='pinkyellowgreen', domainMid=0, domainMin=-2, domainMax=2, reverse=True),
+               'descending', 'x', ('0.5', '-0.5'), ('10',)),
+    ScoreChart(METRICS["dale-chall"], dict(scheme='pinkyellowgreen', domainMid=0, reverse=True),
+               'descending', 'x', ('0.5', '-0.5'), ('7.0', '9.9'), change_legend_title=True),
+)}
+
+WORD_COUNT = METRICS["lexicon_count"]
+
+
+def chart_columns() -> list[str]:
+    """Returns the columns of the dataset used by the charts."""
+    columns = [WORD_COUNT.previous_column, WORD_COUNT.current_column]
+    for chart in SCORE_CHARTS.values():
+        columns += [chart.metric.previous_column, chart.metric.current_column]
+    return columns + ['url']
+
+
+def chart_data(path: str = DATA_PATH) -> pd.DataFrame:
+    """Returns the frame which every chart refers to. It is built once per version of the dataset."""
+    return memoize("chart_data", lambda: load_dataset(path, chart_columns()).reset_index(), path)
+
+
+def _data() -> alt.NamedData:
+    return alt.NamedData(name=DATASET_NAME)
+
+
+def _base() -> alt.Chart:
+    return alt.Chart()
+
+
+def _rule(channel: str, value: str) -> alt.Chart:
+    return _base().mark_rule(color='red', opacity=0.3).encode(
+        **{channel: f'{channel}:Q'}
+    ).transform_calculate(
+        **{channel: value}
+    )
+
+
+def _tooltip(chart: ScoreChart) -> list:
+    return ['index:N', f'{chart.metric.current_column}:Q', alt.Tooltip(f'{chart.metric.diff_column}:Q', title='diff')]
+
+
+def _change_layers(chart: ScoreChart, selection=None, width: int = 800, height: int = 800) -> list[alt.Chart]:
+    metric = chart.metric
+    color = alt.Color(f'{metric.diff_column}:Q', scale=alt.Scale(**chart.scale),
+                      title=chart.title if chart.change_legend_title else 'diff')
+
+    points = _base().mark_circle(size=100).encode(
+        x=alt.X(f'{WORD_COUNT.current_column}:Q', title='2020 Word Count'),
+        y=alt.Y(f'{metric.diff_column}:Q', title=chart.title, sort=chart.change_sort),
+        color=color,
+        tooltip=_tooltip(chart),
+        href='url:N'
+    ).properties(
+        width=width,
+        height=height
+    )
+    if selection is not None:
+        points = points.transform_filter(selection)
+
+    return [*[_rule('y', value) for value in chart.change_rules], points]
+
+
+def change_chart(chart: ScoreChart) -> alt.LayerChart:
+    """Scatter plot of the change in score of every section against its word count."""
+    return alt.layer(*_change_layers(chart), data=_data())
+
+
+def _ordered_layers(chart: ScoreChart, selection=None, width: int = 800, height: int = 1200) -> list[alt.Chart]:
+    metric = chart.metric
+    y = alt.Y('index:N', sort=chart.order_sort, title='Section', axis=alt.Axis(labels=False))
+
+    bars = _base().mark_bar().encode(
+        x2=alt.X2(metric.previous_column, title=f'Previous {metric.abbreviation}'),
+        x=alt.X(f'{metric.current_column}:Q', title=f'2020 {metric.abbreviation}'),
+        y=y,
+        color=alt.Color(f'{metric.diff_column}:Q', scale=alt.Scale(**chart.scale), title=chart.title),
+        tooltip=_tooltip(chart),
+        href='url:N'
+    ).properties(
+        height=height,
+        width=width
+    )
+
+    line = _base().mark_line().encode(
+        x=alt.X(f'{metric.current_column}:Q', title=f'2020 {metric.abbreviation}'),
+        y=y,
+    )
+    if selection is not None:
+        bars, line = bars.transform_filter(selection), line.transform_filter(selection)
+
+    rules = [_rule('x', value) for value in chart.score_rules]
+    if chart.rules_over_bars:
+        return [bars, *rules, line]
+    return [*rules, bars, line]
+
+
+def ordered_chart(chart: ScoreChart) -> alt.LayerChart:
+    """Bar chart of the previous and current score of every section, ordered by the current score."""
+    return alt.layer(*_ordered_layers(chart), data=_data())
+
+
+def word_count_chart() -> alt.Chart:
+    """Heatmap of the change in word count of sections against their word count."""
+    return alt.Chart(_data()).mark_rect().encode(
+        x=alt.X(f'{WORD_COUNT.current_column}:O', title='2020 Word Count', bin=alt.BinParams(step=100)),
+        y=alt.Y(f'{WORD_COUNT.diff_column}:O', title='Change in Word Count'),
+        color="count()"
+    )
+
+
+def dashboard_chart() -> alt.VConcatChart:
+    """
+    Linked charts of every metric. Dragging a rectangle over the scatter plot of the change in word count selects
+    sections, and the charts of every score below it only show the selected sections. The selection is made in the
+    browser, so it does not rerun the app.
+    """
+    brush = alt.selection_interval(name=BRUSH_NAME, encodings=['x', 'y'])
+    word_counts = _base().mark_circle(size=60).encode(
+        x=alt.X(f'{WORD_COUNT.current_column}:Q', title='2020 Word Count'),
+        y=alt.Y(f'{WORD_COUNT.diff_column}:Q', title='Change in Word Count'),
+        color=alt.condition(brush, alt.value('steelblue'), alt.value('lightgray')),
+        tooltip=['index:N', f'{WORD_COUNT.current_column}:Q',
+                 alt.Tooltip(f'{WORD_COUNT.diff_column}:Q', title='diff')],
+        href='url:N'
+    ).add_selection(
+        brush
+    ).properties(
+        width=800,
+        height=300,
+        title='Drag to select sections'
+    )
+    rows = [alt.hconcat(alt.layer(*_change_layers(chart, brush, width=390, height=300), title=chart.title),
+                        alt.layer(*_ordered_layers(chart, brush, width=390, height=300),
+                                  title=f'{chart.metric.abbreviation} of each section (ordered)'))
+            .resolve_scale(color='shared')
+            for chart in SCORE_CHARTS.values()]
+    return alt.vconcat(word_counts, *rows, data=_data())
+
+
+def _density_rects(title: str, y_title: str) -> alt.Chart:
+    return _base().mark_rect().encode(
+        x=alt.X('x_start:Q', title=title),
+        x2='x_end:Q',
+        y=alt.Y('y_start:Q', title=y_title),
+        y2='y_end:Q',
+        color=alt.Color('count:Q', title='Sections', scale=alt.Scale(type='log')),
+        tooltip=[alt.Tooltip('count:Q', title='Sections'), alt.Tooltip('index:N', title='Example')],
+        href='url:N'
+    )
+
+
+def change_density_chart(chart: ScoreChart) -> alt.LayerChart:
+    """Density of the change in score of sections against their word count. Draws the output of `density`."""
+    rects = _density_rects('2020 Word Count', chart.title).properties(
+        width=800,
+        height=800
+    )
+    return alt.layer(*[_rule('y', value) for value in chart.change_rules], rects, data=_data())
+
+
+def quantile_chart(chart: ScoreChart) -> alt.LayerChart:
+    """Bar chart of the mean previous and current score of each quantile. Draws the output of `quantiles`."""
+    metric = chart.metric
+    y = alt.Y('quantile:O', title='Sections (quantiles)', axis=alt.Axis(labels=False))
+    tooltip = [alt.Tooltip('index:N', title='Median section'), alt.Tooltip('count:Q', title='Sections'),
+               alt.Tooltip('current_min:Q', title=f'Lowest 2020 {metric.abbreviation}'),
+               alt.Tooltip('current_max:Q', title=f'Highest 2020 {metric.abbreviation}'),
+               alt.Tooltip('diff_mean:Q', title='Mean diff')]
+
+    bars = _base().mark_bar().encode(
+        x2=alt.X2('previous_mean', title=f'Previous {metric.abbreviation} (mean)'),
+        x=alt.X('current_mean:Q', title=f'2020 {metric.abbreviation} (mean)'),
+        y=y,
+        color=alt.Color('diff_mean:Q', scale=alt.Scale(**chart.scale), title=chart.title),
+        tooltip=tooltip,
+        href='url:N'
+    ).properties(
+        height=800,
+        width=800
+    )
+
+    line = _base().mark_line().encode(
+        x=alt.X('current_mean:Q', title=f'2020 {metric.abbreviation} (mean)'),
+        y=y,
+    )
+
+    rules = [_rule('x', value) for value in chart.score_rules]
+    if chart.rules_over_bars:
+        return alt.layer(bars, *rules, line, data=_data())
+    return alt.layer(*rules, bars, line, data=_data())
+
+
+def word_count_density_chart() -> alt.Chart:
+    """Heatmap of the change in word count of sections against their word count. Draws the output of `density`."""
+    rects = _density_rects('2020 Word Count', 'Change in Word Count')
+    rects.data = _data()
+    return rects
+
+
+def pattern_chart(metric: Metric) -> alt.Chart:
+    """Bar chart of the number of sections of every rewrite pattern, coloured by their mean change in `metric`."""
+    scale = SCORE_CHARTS[metric.key].scale if metric.key in SCORE_CHARTS else dict(scheme='blueorange', domainMid=0)
+    title = f"Mean change in {metric.abbreviation}"
+    return alt.Chart(alt.NamedData(name=PATTERNS_DATASET_NAME)).mark_bar().encode(
+        x=alt.X('sections:Q', title='Number of sections'),
+        y=alt.Y('pattern:N', title='Rewrite', sort='-x'),
+        color=alt.Color(f'{metric.diff_column}:Q', scale=alt.Scale(**scale), title=title),
+        tooltip=['pattern:N', 'occurrences:Q', 'sections:Q',
+                 alt.Tooltip(f'{metric.diff_column}:Q', title=title, format='.2f'), 'example:N'],
+        href='url:N'
+    ).properties(
+        width=800
+    )
+
+
+def _fields(spec) -> set[str]:
+    """Returns the name of every field which `spec` refers to."""
+    if isinstance(spec, list):
+        return set().union(*map(_fields, spec))
+    if not isinstance(spec, dict):
+        return set()
+    fields = {spec["field"]} if isinstance(spec.get("field"), str) else set()
+    return fields.union(*map(_fields, spec.values()))
+
+
+@lru_cache(maxsize=None)
+def _spec(metric_key: str, kind: str) -> tuple[str, frozenset[str]]:
+    if kind == "patterns":
+        chart = pattern_chart(METRICS[metric_key])
+    elif kind == "dashboard":
+        chart = dashboard_chart()
+    elif metric_key == WORD_COUNT.key:
+        chart = word_count_density_chart() if kind == "density" else word_count_chart()
+    elif kind == "change":
+        chart = change_chart(SCORE_CHARTS[metric_key])
+    elif kind == "density":
+        chart = change_density_chart(SCORE_CHARTS[metric_key])
+    elif kind == "quantiles":
+        chart = quantile_chart(SCORE_CHARTS[metric_key])
+    else:
+        chart = ordered_chart(SCORE_CHARTS[metric_key])
+    spec = chart.to_dict()
+    spec.pop("data", None)
+    return json.dumps(spec), frozenset(_fields(spec))
+
+
+def chart_spec(metric_key: str, kind: str = "change") -> dict:
+    """
+    Returns the Vega-Lite spec of a chart, without any data.
+    The spec is built once per process; every call returns a new copy of it.
+    :param metric_key: Key of the metric, as in `metrics.METRICS`.
+    :param kind: "change" or "ordered", or "density" or "quantiles" for their aggregated versions.
+        The word count only has a heatmap ("change") and its aggregated version ("density").
+        "patterns" is the chart of rewrite patterns of any metric, and "dashboard" the linked charts of every metric
+        whatever `metric_key` (see `dashboard_chart`).
+    """
+    return json.loads(_spec(metric_key, kind)[0])
+
+
+def _project(frame: pd.DataFrame, metric_key: str, kind: str) -> pd.DataFrame:
+    """Returns the columns of `frame` which the chart refers to, so that only they are sent to the browser."""
+    fields = _spec(metric_key, kind)[1]
+    return frame[[column for column in frame.columns if column in fields]]
+
+
+def _aggregate(data: pd.DataFrame, metric_key: str, kind: str) -> pd.DataFrame:
+    if metric_key == WORD_COUNT.key:
+        return density(data, WORD_COUNT.current_column, WORD_COUNT.diff_column, x_step=100)
+    chart = SCORE_CHARTS[metric_key]
+    if kind == "density":
+        return density(data, WORD_COUNT.current_column, chart.metric.diff_column)
+    return quantiles(data, chart.metric, ascending=chart.order_sort == "x")
+
+
+def aggregated_data(metric_key: str, kind: str, path: str = DATA_PATH) -> pd.DataFrame:
+    """
+    Returns the binned data drawn by an aggregated chart. It is computed once per version of the dataset.
+    :param metric_key: Key of the metric, as in `metrics.METRICS`.
+    :param kind: "density" or "quantiles".
+    :param path: Path to the dataset.
+    """
+    return memoize(("aggregated_data", metric_key, kind), lambda: _aggregate(chart_data(path), metric_key, kind),
+                   path)
+
+
+def chart_view(metric_key: str, kind: str = "change", path: str = DATA_PATH,
+               threshold: int = AGGREGATE_THRESHOLD, data: pd.DataFrame | None = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Returns the data and the spec to draw a chart, aggregating the data if there are more than `threshold` sections.
+    :param metric_key: Key of the metric, as in `metrics.METRICS`.
+    :param kind: "change" or "ordered".
+    :param path: Path to the dataset.
+    :param threshold: Number of sections above which the data is aggregated.
+    :param data: Optional frame to draw instead of the dataset, with the columns of `chart_data`, such as the
+        comparison of two dates of the timeline (see `timeline.py`). Its aggregated data is not cached.
+    :return: The columns of the data which the spec refers to, and the spec.
+    """
+    frame = chart_data(path) if data is None else data
+    if len(frame.index) <= threshold:
+        return _project(frame, metric_key, kind), chart_spec(metric_key, kind)
+    aggregated_kind = "density" if kind == "change" or metric_key == WORD_COUNT.key else "quantiles"
+    aggregated = aggregated_data(metric_key, aggregated_kind, path) if data is None \
+        else _aggregate(data, metric_key, aggregated_kind)
+    return _project(aggregated, metric_key, aggregated_kind), chart_spec(metric_key, aggregated_kind)
+
+
+def dashboard_view(path: str = DATA_PATH, threshold: int = AGGREGATE_THRESHOLD,
+                   data: pd.DataFrame | None = None) -> tuple[pd.DataFrame, dict] | None:
+    """
+    Returns the data and the spec of the linked charts of every metric, or None if there are more than `threshold`
+    sections, as the charts draw every section.
+    Every chart refers to the same frame, so it is sent to the browser once for all of them.
+    :param path: Path to the dataset.
+    :param threshold: Number of sections above which there are no linked charts.
+    :param data: Optional frame to draw instead of the dataset, as in `chart_view`.
+    """
+    frame = chart_data(path) if data is None else data
+    if len(frame.index) > threshold:
+        return None
+    return _project(frame, WORD_COUNT.key, "dashboard"), chart_spec(WORD_COUNT.key, "dashboard")
+
+
+def pattern_view(metric_key: str, top: int = 30, tag: str | None = None,
+                 path: str = DATA_PATH) -> tuple[pd.DataFrame, dict] | None:
+    """
+    Returns the data and the spec to draw the most frequent rewrite patterns, or None if `patterns.py` was not run.
+    :param metric_key: Key of the metric whose mean change colours the patterns.
+    :param top: Number of patterns to draw.
+    :param tag: Optional kind of pattern to draw: "replace", "insert" or "delete".
+    :param path: Path to the dataset, which holds the links to the example sections.
+    """
+    from patterns import load_patterns
+
+    patterns = load_patterns()
+    if patterns is None:
+        return None
+    if tag:
+        patterns = patterns[patterns["tag"] == tag]
+    patterns = patterns.head(top).copy()
+    urls = chart_data(path).drop_duplicates("index").set_index("index")["url"]
+    patterns["url"] = patterns["example"].map(urls)
+    return _project(patterns, metric_key, "patterns"), chart_spec(metric_key, "patterns")
+
+
+def export_specs(output: str = VEGA_SOURCE_PATH, data_url: str = f"{DATASET_NAME}.json",
+                 path: str = DATA_PATH) -> list[str]:
+    """
+    Writes the spec of every chart to `output`, with the data in a separate file referenced by `data_url`.
+    :param output: Directory to write to.
+    :param data_url: URL of the data, relative to the page the charts are embedded in.
+    :param path: Path to the dataset.
+    :return: The paths of the files written.
+    """
+    os.makedirs(output, exist_ok=True)
+    written = [os.path.join(output, os.path.basename(data_url))]
+    chart_data(path).to_json(written[0], orient="records")
+
+    files = {f"{chart.metric.abbreviation.lower()}_{kind}_vega.json": (key, kind)
+             for key, chart in SCORE_CHARTS.items() for kind in ("change", "ordered")}
+    files["word_count_heatmap_vega.json"] = (WORD_COUNT.key, "change")
+    for file_name, (key, kind) in files.items():
+        spec = chart_spec(key, kind)
+        spec["data"] = {"url": data_url}
+        written.append(os.path.join(output, file_name))
+        with open(written[-1], "w", encoding="utf-8") as file:
+            json.dump(spec, file, indent=2)
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write the Vega-Lite specs of the Graph Explorer's charts.")
+    parser.add_argument("--output", default=VEGA_SOURCE_PATH)
+    parser.add_argument("--data-url", default=f"{DATASET_NAME}.json")
+    arguments = parser.parse_args()
+    for written in export_specs(arguments.output, arguments.data_url):
+        print(written)
@@ -0,0 +1,112 @@
+"""
+Shared access to the PLUS Explorer dataset.
+
+Streamlit reruns a script from the top on every widget interaction. Both apps therefore load the dataset through
+this module, which parses the file once per process and only parses it again when the file on disk changes.
+"""
+from __future__ import annotations
+
+import os
+import threading
+
+import pandas as pd
+
+from metrics import add_deltas
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data.csv.gz")
+
+_lock = threading.RLock()
+_cache: dict[tuple, tuple[tuple[int, int], object]] = {}
+
+
+def dataset_version(path: str = DATA_PATH) -> tuple[int, int]:
+    """
+    Returns a token which changes whenever the file at `path` is modified.
+    :param path: Path to the dataset.
+    :return: The modification time and size of the file.
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _cached(key, version, loader):
+    with _lock:
+        cached = _cache.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, loader())
+            _cache[key] = cached
+    return cached[1]
+
+
+def _open_store(path: str):
+    from store import META_FILE, STORE_PATH, open_store
+    meta_path = os.path.join(STORE_PATH, META_FILE)
+    version = dataset_version(path), dataset_version(meta_path) if os.path.exists(meta_path) else None
+    return _cached(("store", path), version, lambda: open_store(path, STORE_PATH))
+
+
+def _read_dataset(path: str, columns: tuple[str, ...] | None) -> pd.DataFrame:
+    store = _open_store(path)
+    if store is not None:
+        frame = store.frame(list(columns) if columns else None)
+    elif columns:
+        frame = _load(path, None)[list(columns)]
+    else:
+        frame = pd.read_csv(path, index_col=0)
+    return add_deltas(frame)
+
+
+def _load(path: str, columns: tuple[str, ...] | None) -> pd.DataFrame:
+    return _cached((path, columns), dataset_version(path), lambda: _read_dataset(path, columns))
+
+
+def load_dataset(path: str = DATA_PATH, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Returns the dataset found at `path`.
+    The data is read the first time it is requested and again only if the file was modified since.
+    If a columnar store built from the file is available (see `store.py`), the data is read from the store,
+    and only the requested columns are read.
+    The change in every metric whose previous and current columns are loaded is added as a `diff_` column
+    (see `metrics.py`).
+    Every caller gets a shallow copy of the cached frame, so columns added or replaced by one session
+    are not seen by the others. Values should not be modified in place.
+    :param path: Path to the dataset.
+    :param columns: Optional list of columns to load. Defaults to every column.
+    :return: The dataset, indexed by section.
+    """
+    return _load(path, tuple(columns) if columns else None).copy(deep=False)
+
+
+def load_text(column: str, key: str, path: str = DATA_PATH) -> str:
+    """
+    Returns the value of `column` for the section `key`.
+    If a columnar store is available, only that value is read from disk.
+    :param column: Column to read, such as "previous" or "current".
+    :param key: The section to read. If the key is repeated in the dataset, the first section is used.
+    :param path: Path to the dataset.
+    """
+    store = _open_store(path)
+    if store is not None:
+        return store.text(column, key)
+    values = _load(path, None)[column]
+    position = values.index.get_indexer_for([key])[0]
+    if position < 0:
+        raise KeyError(key)
+    return values.iloc[position]
+
+
+def memoize(key, loader, path: str = DATA_PATH):
+    """
+    Returns the result of `loader()`, computed once per version of the dataset at `path`.
+    Use this for anything derived from the dataset which should be shared by every session.
+    :param key: Hashable key identifying what `loader` computes.
+    :param loader: Function without arguments computing the value.
+    :param path: Path to the dataset the value is derived from.
+    """
+    return _cached(("memoize", key, path), dataset_version(path), loader)
+
+
+def clear_cache():
+    """Drops every cached dataset and memoized value."""
+    with _lock:
+        _cache.clear()
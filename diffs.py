@@ -0,0 +1,186 @@
+"""
+Cache of redline diffs between the previous and current text of a section.
+
+Diffs are keyed by a hash of the two texts, so a diff is computed at most once per pair of texts however many
+sessions ask for it. Recently used diffs are kept in memory. Diffs can also be computed in advance for the whole
+dataset and written to a SQLite file, which is consulted before computing a diff:
+
+    python store.py --diffs
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from ipynb.helpers import Redlines, Vocabulary, markdown_paragraphs
+from store import STORE_PATH
+
+DIFFS_FILE = "diffs.sqlite"
+
+
+class Diff(NamedTuple):
+    opcodes: list[tuple[str, int, int, int, int]]
+    markdown: str
+
+
+def diff_key(source: str, test: str) -> str:
+    """Returns a hash identifying the pair of texts `source` and `test`."""
+    digest = hashlib.sha256()
+    for text in (source, test):
+        encoded = text.encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def compute_diff(source: str, test: str, vocabulary: Vocabulary | None = None) -> Diff:
+    """
+    Compares `source` with `test` without using any cache.
+    :param vocabulary: Optional `Vocabulary` to keep the tokens as IDs, shared to save memory when diffing many texts.
+    """
+    redline = Redlines(source, vocabulary=vocabulary)
+    redline.test = test
+    return Diff(redline.opcodes, redline.output_markdown)
+
+
+def _opcodes(stored: str) -> list[tuple[str, int, int, int, int]]:
+    return [tuple(opcode) for opcode in json.loads(stored)]
+
+
+class DiffCache:
+    """
+    An in-memory LRU cache of diffs, optionally backed by a file of precomputed diffs.
+    Instances are safe to share between threads.
+    """
+
+    def __init__(self, maxsize: int = 256, path: str | None = None):
+        """
+        :param maxsize: Maximum number of diffs to keep in memory.
+        :param path: Optional path to a file written by `precompute_diffs`.
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self._entries: OrderedDict[str, Diff] = OrderedDict()
+        # Opcodes of the diffs asked for by `get_opcodes`, whose markdown is never built.
+        self._opcodes: OrderedDict[str, list[tuple[str, int, int, int, int]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def _read_precomputed(self, key: str, columns: str = "opcodes, markdown") -> tuple | None:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        if self._connection is None:
+            self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return self._connection.execute(f"SELECT {columns} FROM diffs WHERE key = ?", (key,)).fetchone()
+
+    def get(self, source: str, test: str) -> Diff:
+        """Returns the diff between `source` and `test`, computing it only if it is not cached."""
+        key = diff_key(source, test)
+        with self._lock:
+            diff = self._entries.get(key)
+            if diff is not None:
+                self._entries.move_to_end(key)
+                return diff
+            row = self._read_precomputed(key)
+            if row is not None:
+                diff = Diff(_opcodes(row[0]), row[1])
+
+        if diff is None:
+            diff = compute_diff(source, test)
+
+        with self._lock:
+            self._entries[key] = diff
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return diff
+
+    def get_opcodes(self, source: str, test: str,
+                    redline: Redlines | None = None) -> list[tuple[str, int, int, int, int]]:
+        """
+        Returns only the opcodes of the diff between `source` and `test`, without building its markdown.
+        :param redline: Optional `Redlines` of `source` and `test` to compute the opcodes with if they are not cached,
+            so that texts the caller has already tokenized are not tokenized again.
+        """
+        key = diff_key(source, test)
+        with self._lock:
+            diff = self._entries.get(key)
+            if diff is not None:
+                self._entries.move_to_end(key)
+                return diff.opcodes
+            opcodes = self._opcodes.get(key)
+            if opcodes is not None:
+                self._opcodes.move_to_end(key)
+                return opcodes
+            row = self._read_precomputed(key, "opcodes")
+            if row is not None:
+                opcodes = _opcodes(row[0])
+
+        if opcodes is None:
+            if redline is None:
+                redline = Redlines(source)
+                redline.test = test
+            opcodes = redline.opcodes
+
+        with self._lock:
+            self._opcodes[key] = opcodes
+            self._opcodes.move_to_end(key)
+            while len(self._opcodes) > self.maxsize:
+                self._opcodes.popitem(last=False)
+        return opcodes
+
+    def clear(self):
+        """Drops every diff kept in memory."""
+        with self._lock:
+            self._entries.clear()
+            self._opcodes.clear()
+
+
+def precompute_diffs(pairs, path: str) -> int:
+    """
+    Computes the diff of every pair of texts and writes them to `path`.
+    Pairs which are already in the file are skipped.
+    :param pairs: Iterable of (source, test) pairs of texts.
+    :param path: Path to the SQLite file to write.
+    :return: The number of diffs computed.
+    """
+    connection = sqlite3.connect(path)
+    vocabulary = Vocabulary()
+    count = 0
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS diffs (key TEXT PRIMARY KEY, opcodes TEXT, markdown TEXT)")
+        for source, test in pairs:
+            key = diff_key(source, test)
+            if connection.execute("SELECT 1 FROM diffs WHERE key = ?", (key,)).fetchone():
+                continue
+            diff = compute_diff(source, test, vocabulary)
+            connection.execute("INSERT INTO diffs VALUES (?, ?, ?)", (key, json.dumps(diff.opcodes), diff.markdown))
+            count += 1
+    connection.close()
+    return count
+
+
+_default_cache = DiffCache(path=os.path.join(STORE_PATH, DIFFS_FILE))
+
+
+def get_diff(source: str, test: str) -> Diff:
+    """Returns the diff between `source` and `test` from the process-wide cache."""
+    return _default_cache.get(source, test)
+
+
+def diff_paragraphs(source: str, test: str, paragraph_length: int = 1000):
+    """
+    Yields the diff between `source` and `test` in markdown format a paragraph at a time, as (changed, markdown)
+    pairs (see `ipynb.helpers.markdown_paragraphs`). Only the opcodes are taken from the cache, so the markdown of
+    the whole diff is never built, and each paragraph is built when it is requested. The texts are tokenized once,
+    for both the opcodes and the paragraphs.
+    """
+    redline = Redlines(source)
+    redline.test = test
+    opcodes = _default_cache.get_opcodes(source, test, redline)
+    return markdown_paragraphs(*redline.tokens, opcodes, paragraph_length)
@@ -1,6 +1,18 @@
-import pandas as pd
+from __future__ import annotations
+
 import streamlit as st
-from redlines import Redlines
+
+from dataset import load_text
+from diffs import diff_paragraphs, get_diff
+from metrics import METRICS
+from navigation import prefetch, session_order
+from percentiles import corpus_statistics
+from sections import explorer_url, section_index
+from similarity import BOILERPLATE_SECTIONS, similarity_index
+from textindex import SEARCH_MODES, text_index
+from timeline import open_timeline
+from timing import finish_run, stage, start_run, write_summary
+from timing import query_params as timing_params
 
 st.set_page_config(
     page_title='PLUS Explorer - Section',
@@ -13,6 +25,7 @@ st.set_page_config(
 )
 
 st.title('PLUS Explorer')
+start_run('explorer', st.experimental_get_query_params())
 with st.expander('Introduction'):
     st.write('''
 On 31 December 2021, the [Attorney General Chambers of Singapore completed a universal revision of 
@@ -44,29 +57,70 @@ I left them inside the dataset as it was important to show that not all sections
 
 # Load data
 
-dataset = pd.read_csv("data.csv.gz", index_col=0)
+with stage('load', 'sections'):
+    sections = section_index()
+with stage('load', 'statistics'):
+    statistics = corpus_statistics()
 
 
 # Section Explorer
 
-def random_button_clicked():
-    return random.choice(dataset.index.to_list())
+# Sections longer than this (in characters) are marked up paragraph by paragraph,
+# with long runs of unchanged text hidden until they are asked for.
+LONG_SECTION_LENGTH = 10000
+UNCHANGED_RUN_LENGTH = 3000
+
+
+def write_redline(previous_text: str, current_text: str, key: str):
+    unchanged, unchanged_length, run, shown = [], 0, 0, None
+    for changed, paragraph in diff_paragraphs(previous_text, current_text):
+        if not changed:
+            unchanged_length += len(paragraph)
+            if shown is None and unchanged_length < UNCHANGED_RUN_LENGTH:
+                unchanged.append(paragraph)
+            else:
+                if shown is None:
+                    shown = st.checkbox("Show unchanged text", key=f"unchanged_{key}_{run}")
+                    paragraph = "".join(unchanged + [paragraph]) if shown else ""
+                    unchanged = []
+                if shown:
+                    st.markdown(paragraph, unsafe_allow_html=True)
+            continue
+        if shown is False:
+            st.caption(f"{unchanged_length:,} characters of unchanged text hidden")
+        for buffered in unchanged:
+            st.markdown(buffered, unsafe_allow_html=True)
+        st.markdown(paragraph, unsafe_allow_html=True)
+        unchanged, unchanged_length, run, shown = [], 0, run + 1, None
+    if shown is False:
+        st.caption(f"{unchanged_length:,} characters of unchanged text hidden")
+    for buffered in unchanged:
+        st.markdown(buffered, unsafe_allow_html=True)
+
+
+def readability_rank(section, metric_key: str) -> str:
+    share = statistics.better_than(metric_key, section.current(metric_key))
+    return f"Easier to read than {share:.0%} of sections"
+
+
+def version_index(dates: list[str], date: str | None, default: int) -> int:
+    """Returns the position in `dates` of the version in force on `date`, or `default` if there is none."""
+    earlier = [position for position, version_date in enumerate(dates) if date and version_date <= date]
+    return earlier[-1] if earlier else default
 
 
 def on_select():
-    st.experimental_set_query_params(section=st.session_state.selectbox)
+    st.experimental_set_query_params(section=st.session_state.selectbox,
+                                     **timing_params(st.experimental_get_query_params()))
 
 
-with st.container():
-    st.write("## Section Explorer")
+def on_random():
+    key = sections.keys()[session_order(st.session_state, len(sections)).next()]
+    st.experimental_set_query_params(section=key, **timing_params(st.experimental_get_query_params()))
 
-    st.selectbox("Select a Section to explore", dataset.index, on_change=on_select, key='selectbox')
-    st.write(f'Total number of records: {dataset.index.size}')
-    if st.button("Random"):
-        import random
 
-        random_select = random.choice(range(dataset.index.size))
-        st.experimental_set_query_params(section=dataset.index[random_select])
+with st.container():
+    st.write("## Section Explorer")
 
     query_params = st.experimental_get_query_params()
     if "section" in query_params:
@@ -74,43 +128,146 @@ with st.container():
     else:
         section_explorer_select = 'Civil Law Act 1909 Section 6'
 
+    search = st.text_input("Search for a Section by Act name or section number", key='search')
+    with stage('search') as timed:
+        options = sections.search(search)
+        if timed:
+            timed.size = len(options)
+    if not search and section_explorer_select in sections and section_explorer_select not in options:
+        options.insert(0, section_explorer_select)
+    st.selectbox("Select a Section to explore", options, on_change=on_select, key='selectbox',
+                 index=options.index(section_explorer_select) if section_explorer_select in options else 0)
+    if search and not options:
+        st.caption('No sections match your search.')
+    st.write(f'Total number of records: {len(sections)}')
+    st.button("Random", on_click=on_random)
+
+    with stage('lookup', section_explorer_select):
+        section = sections.get(section_explorer_select)
+    if len(sections):
+        prefetch(sections.keys()[session_order(st.session_state, len(sections)).peek()])
+
     st.header(section_explorer_select)
+    timeline = open_timeline()
+    versions = timeline.versions(section_explorer_select) if timeline is not None else []
+    version_captions = ("Previous Text", "2020 Rev Edn Text")
+    compare_dates = len(versions) > 1 and st.checkbox("Compare the versions in force on other dates",
+                                                      value="from" in query_params)
+    if compare_dates:
+        dates = [version.date for version in versions]
+        from_column, to_column = st.columns(2)
+        from_date = from_column.selectbox("Compare the version in force on", dates,
+                                          index=version_index(dates, query_params.get("from", [None])[0],
+                                                              len(dates) - 2))
+        to_date = to_column.selectbox("With the version in force on", dates,
+                                      index=version_index(dates, query_params.get("to", [None])[0], len(dates) - 1))
+        with stage('load_text.timeline', section_explorer_select) as timed:
+            section, previous_text, current_text = timeline.section(section_explorer_select, from_date, to_date)
+            if timed:
+                timed.size = len(previous_text) + len(current_text)
+        version_captions = (f"Text in force on {from_date}", f"Text in force on {to_date}")
+    else:
+        with stage('load_text', section_explorer_select) as timed:
+            previous_text = load_text('previous', section_explorer_select)
+            current_text = load_text('current', section_explorer_select)
+            if timed:
+                timed.size = len(previous_text) + len(current_text)
     st.subheader('Mark Changes')
-    diff = Redlines(dataset['previous'][section_explorer_select], dataset['current'][section_explorer_select])
-    st.markdown(diff.output_markdown, unsafe_allow_html=True)
+    long_section = max(len(previous_text), len(current_text)) > LONG_SECTION_LENGTH
+    if long_section:
+        with stage('redline.paragraphs', section_explorer_select):
+            write_redline(previous_text, current_text, section_explorer_select)
+    else:
+        with stage('diff', section_explorer_select) as timed:
+            markdown = get_diff(previous_text, current_text).markdown
+            if timed:
+                timed.size = len(markdown)
+        with stage('redline', section_explorer_select):
+            st.markdown(markdown, unsafe_allow_html=True)
     st.caption("**NB:** If there are no marked changes, the text is the same.")
 
     st.subheader('Readability Statistics')
     flesch, fog, ari = st.columns(3)
-    flesch.metric("Flesch Reading Ease", dataset["current_flesch_reading_ease"][section_explorer_select],
-                  dataset["current_flesch_reading_ease"][section_explorer_select] -
-                  dataset["previous_flesch_reading_ease"][section_explorer_select])
-    fog.metric("Fog Scale", dataset["current_gunning_fog"][section_explorer_select],
-               dataset["current_gunning_fog"][section_explorer_select] -
-               dataset["previous_gunning_fog"][section_explorer_select], delta_color="inverse")
-    ari.metric("Automated Readability Index", dataset["current_ari"][section_explorer_select],
-               dataset["current_ari"][section_explorer_select] -
-               dataset["previous_ari"][section_explorer_select], delta_color="inverse")
+    flesch.metric("Flesch Reading Ease", section.current("flesch_reading_ease"), section.delta("flesch_reading_ease"))
+    flesch.caption(readability_rank(section, "flesch_reading_ease"))
+    fog.metric("Fog Scale", section.current("gunning_fog"), section.delta("gunning_fog"), delta_color="inverse")
+    fog.caption(readability_rank(section, "gunning_fog"))
+    ari.metric("Automated Readability Index", section.current("ari"), section.delta("ari"), delta_color="inverse")
+    ari.caption(readability_rank(section, "ari"))
     dale, _, _ = st.columns(3)
-    dale.metric("Dale-Chall Readability Score", dataset["current_dale-chall"][section_explorer_select],
-                dataset["current_dale-chall"][section_explorer_select] -
-                dataset["previous_dale-chall"][section_explorer_select], delta_color="inverse")
+    dale.metric("Dale-Chall Readability Score", section.current("dale-chall"), section.delta("dale-chall"),
+                delta_color="inverse")
+    dale.caption(readability_rank(section, "dale-chall"))
+    st.caption(f"Among the {len(sections)} sections, the FRE of {statistics.share_improved('flesch_reading_ease'):.0%} "
+               f"and the Dale-Chall score of {statistics.share_improved('dale-chall'):.0%} improved after revision.")
     length, words, sentences = st.columns(3)
-    length.metric("Length of Section (Characters)", dataset["current_len"][section_explorer_select],
-                  dataset["current_len"][section_explorer_select] -
-                  dataset["previous_len"][section_explorer_select], delta_color="off")
-    sentences.metric("No of Sentences", dataset["current_sentence_count"][section_explorer_select],
-                     dataset["current_sentence_count"][section_explorer_select] -
-                     dataset["previous_sentence_count"][section_explorer_select], delta_color="off")
-    words.metric("No of Words", dataset["current_lexicon_count"][section_explorer_select],
-                 dataset["current_lexicon_count"][section_explorer_select] -
-                 dataset["previous_lexicon_count"][section_explorer_select], delta_color="off")
+    length.metric("Length of Section (Characters)", section.current("len"), section.delta("len"), delta_color="off")
+    sentences.metric("No of Sentences", section.current("sentence_count"), section.delta("sentence_count"),
+                     delta_color="off")
+    words.metric("No of Words", section.current("lexicon_count"), section.delta("lexicon_count"), delta_color="off")
+
+    if st.checkbox("Show the readability of every sentence"):
+        from alignment import align_texts, sentence_table
+
+        try:
+            with stage('sentences', section_explorer_select) as timed:
+                if compare_dates:
+                    aligned = align_texts(previous_text, current_text)
+                else:
+                    aligned = sentence_table().section(section_explorer_select, previous_text, current_text)
+                if timed:
+                    timed.size = len(aligned.index)
+        except ModuleNotFoundError:
+            st.caption("Scoring sentences needs the `notebook` extras. "
+                       "Install them, or align the sentences of the dataset with `python store.py --sentences`.")
+        else:
+            readability_metrics = [metric for metric in METRICS.values() if metric.delta_color != "off"]
+            changes = {metric.diff_column: f"Change in {metric.abbreviation}" for metric in readability_metrics}
+            st.dataframe(aligned[["tag", "previous", "current", *changes]].round(2).rename(columns=changes))
+            st.caption("Sentences are aligned by the words left unchanged in them. A sentence which was split or "
+                       "merged is aligned with all its parts.")
+
+    st.subheader('Similar Sections')
+    with stage('similar', section_explorer_select):
+        similar = similarity_index().similar(section_explorer_select)
+    if similar:
+        st.markdown("\n".join(f"- [{key}]({explorer_url(key)}): {count} near-identical clause{'s' if count > 1 else ''}"
+                               for key, count in similar))
+    else:
+        st.write("No other section shares a clause with this section.")
+    st.caption(f"Clauses found in more than {BOILERPLATE_SECTIONS} sections, such as common penalty clauses, "
+               "are left out.")
 
     st.subheader('Text comparison')
-    previous, current = st.columns(2)
+    if not long_section or st.checkbox("Show the full text of this long section"):
+        previous, current = st.columns(2)
+
+        previous.caption(f"{version_captions[0]} [Link]({section.previous_link})")
+        previous.write(previous_text)
+
+        current.caption(f"{version_captions[1]} [Link]({section.current_link})")
+        current.write(current_text)
+
+with st.container():
+    st.write("## Text Search")
 
-    previous.caption(f"Previous Text [Link]({dataset['previous_link'][section_explorer_select]})")
-    previous.write(dataset['previous'][section_explorer_select])
+    phrase = st.text_input("Find sections containing a phrase", help='For example, "shall be guilty of an offence"')
+    mode = st.radio("Search in", list(SEARCH_MODES), format_func=SEARCH_MODES.get)
+    if phrase:
+        with stage('text_search', mode) as timed:
+            results = text_index().search(phrase, mode)
+            if timed:
+                timed.size = len(results.index)
+        st.write(f'{len(results.index)} sections found')
+        top_results = results.head(100).rename(columns={"previous": "In previous text", "current": "In current text"})
+        top_sections = [sections.get(key) for key in top_results.index]
+        for metric in METRICS.values():
+            if metric.delta_color != "off":
+                top_results[f"Change in {metric.abbreviation}"] = [round(section.delta(metric.key), 2)
+                                                                   for section in top_sections]
+        st.dataframe(top_results)
+        st.caption("Sections are ranked by the number of times the phrase appears in them. "
+                   "Case and punctuation are ignored.")
 
-    current.caption(f"2020 Rev Edn Text [Link]({dataset['current_link'][section_explorer_select]})")
-    current.write(dataset['current'][section_explorer_select])
+write_summary()
+finish_run()
@@ -0,0 +1,274 @@
+"""
+Static export of the Section Explorer page of every section.
+
+Every visit to the Section Explorer starts a Python rerun. This module renders the page of every section ahead of
+time, as static files which any web server or object store can serve:
+
+* `sections/<slug>.html`, the redline, the change in every metric and both versions of the text with their links; and
+* `sections/<slug>.json`, the same content as data, with the opcodes of the redline.
+
+`index.html` links to every page, and `manifest.json` records the slug of every section with a hash of everything
+its page is rendered from. A new export only renders the sections whose hash changed, in a pool of processes, and
+removes the pages of sections which are no longer in the dataset.
+
+    python export.py [--output site] [--workers 8]
+    python export.py --url-base https://example.org/plus/
+
+With `--url-base`, the `url` column of the dataset is pointed at the exported pages, as published under that URL, so
+the links in the Graph Explorer open them instead of the Section Explorer.
+"""
+from __future__ import annotations
+
+import hashlib
+import html
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from dataset import DATA_PATH
+from metrics import METRICS
+
+EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "site")
+
+MANIFEST_FILE = "manifest.json"
+
+SECTIONS_DIRECTORY = "sections"
+
+# Version of the pages. Increase it whenever the way pages are rendered changes, so every page is rendered again.
+EXPORT_VERSION = 1
+
+_slug_pattern = re.compile(r"[^a-z0-9]+")
+
+_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title} - PLUS Explorer</title>
+<style>
+body {{ font-family: sans-serif; max-width: 60em; margin: 0 auto; padding: 1em; line-height: 1.5; }}
+.metrics {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(14em, 1fr)); gap: 1em; }}
+.metric strong {{ display: block; font-size: 1.5em; }}
+.better {{ color: #09ab3b; }} .worse {{ color: #ff2b2b; }} .off {{ color: #808495; }}
+.texts {{ display: grid; grid-template-columns: 1fr 1fr; gap: 1em; }}
+.caption {{ color: #808495; font-size: 0.9em; }}
+</style>
+</head>
+<body>
+<p><a href="../index.html">PLUS Explorer</a></p>
+<h1>{title}</h1>
+<h2>Mark Changes</h2>
+<p>{redline}</p>
+<p class="caption"><strong>NB:</strong> If there are no marked changes, the text is the same.</p>
+<h2>Readability Statistics</h2>
+<div class="metrics">
+{metrics}
+</div>
+<h2>Text comparison</h2>
+<div class="texts">
+<div><p class="caption">Previous Text <a href="{previous_link}">Link</a></p><p>{previous}</p></div>
+<div><p class="caption">2020 Rev Edn Text <a href="{current_link}">Link</a></p><p>{current}</p></div>
+</div>
+</body>
+</html>
+"""
+
+_METRIC = '<div class="metric">{name}<strong>{current}</strong><span class="{change}">{delta}</span></div>'
+
+
+def section_slug(key: str) -> str:
+    """
+    Returns the file name of the page of the section `key`, without extension, such as "penal-code-1871-section-300-"
+    followed by a hash of the key, which keeps apart the names of keys differing only in punctuation.
+    """
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+    return f"{_slug_pattern.sub('-', key.lower()).strip('-')[:80]}-{digest}"
+
+
+def static_url(key: str, url_base: str) -> str:
+    """Returns the URL of the exported page of the section `key`, for pages published under `url_base`."""
+    return f"{url_base.rstrip('/')}/{SECTIONS_DIRECTORY}/{section_slug(key)}.html"
+
+
+def content_hash(section: dict) -> str:
+    """Returns a hash of everything the page of `section` is rendered from."""
+    encoded = json.dumps([EXPORT_VERSION, section], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def html_redline(source: str, test: str, opcodes: list[tuple[str, int, int, int, int]]) -> str:
+    """Returns the redline of `source` and `test` as escaped HTML, marked up as in the Section Explorer."""
+    from ipynb.helpers import markdown_styles, tokenize_text
+
+    seq1, seq2 = tokenize_text(source), tokenize_text(test)
+    styles = markdown_styles("red")
+    parts = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            parts.append(html.escape("".join(seq1[i1:i2])))
+            continue
+        if tag in ("delete", "replace"):
+            parts.append(f"<{styles['del'][0]}>{html.escape(''.join(seq1[i1:i2]))}</{styles['del'][1]}>")
+        if tag in ("insert", "replace"):
+            parts.append(f"<{styles['ins'][0]}>{html.escape(''.join(seq2[j1:j2]))}</{styles['ins'][1]}>")
+    return "".join(parts)
+
+
+def _change(delta: float, delta_color: str) -> str:
+    if delta_color == "off" or not delta:
+        return "off"
+    return "better" if (delta > 0) == (delta_color == "normal") else "worse"
+
+
+def render_section(section: dict, output: str) -> str:
+    """
+    Writes the HTML page and the JSON data of `section` to the `sections` directory of `output`.
+    :param section: A row of the dataset as a dict, with its key as `index`.
+    :return: The slug of the section.
+    """
+    from diffs import get_diff
+
+    key, previous, current = section["index"], section["previous"], section["current"]
+    opcodes = get_diff(previous, current).opcodes
+    scores = {metric.key: {"previous": section[metric.previous_column], "current": section[metric.current_column],
+                           "delta": section[metric.current_column] - section[metric.previous_column]}
+              for metric in METRICS.values()}
+    metrics = "\n".join(_METRIC.format(name=html.escape(metric.name), current=scores[metric.key]["current"],
+                                       change=_change(scores[metric.key]["delta"], metric.delta_color),
+                                       delta=f"{scores[metric.key]['delta']:+.2f}")
+                        for metric in METRICS.values())
+
+    slug = section_slug(key)
+    path = os.path.join(output, SECTIONS_DIRECTORY, slug)
+    with open(f"{path}.html", "w", encoding="utf-8") as file:
+        file.write(_PAGE.format(title=html.escape(key), redline=html_redline(previous, current, opcodes),
+                                metrics=metrics, previous=html.escape(previous), current=html.escape(current),
+                                previous_link=html.escape(section["previous_link"], quote=True),
+                                current_link=html.escape(section["current_link"], quote=True)))
+    data = {"key": key, "act_name": section["act_name"], "previous_link": section["previous_link"],
+            "current_link": section["current_link"], "previous": previous, "current": current, "scores": scores,
+            "opcodes": opcodes}
+    with open(f"{path}.json", "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False)
+    return slug
+
+
+def _render_chunk(sections: list[dict], output: str) -> list[str]:
+    return [render_section(section, output) for section in sections]
+
+
+def _read_manifest(output: str) -> dict:
+    path = os.path.join(output, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _write_index(sections: dict[str, str], output: str):
+    items = "\n".join(f'<li><a href="{SECTIONS_DIRECTORY}/{slug}.html">{html.escape(key)}</a></li>'
+                      for key, slug in sections.items())
+    with open(os.path.join(output, "index.html"), "w", encoding="utf-8") as file:
+        file.write('<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+                   '<title>PLUS Explorer</title>\n</head>\n<body>\n<h1>PLUS Explorer</h1>\n'
+                   f'<p>{len(sections)} sections</p>\n<ul>\n{items}\n</ul>\n</body>\n</html>\n')
+
+
+def export_sections(path: str = DATA_PATH, output: str = EXPORT_PATH, workers: int | None = None,
+                    chunk_size: int = 50) -> tuple[int, int]:
+    """
+    Exports the page of every section of the dataset at `path` to `output`, skipping the sections whose page is up
+    to date.
+    :param path: Path to the dataset.
+    :param output: Directory to write to. It is created if it does not exist.
+    :param workers: Number of processes rendering pages. Defaults to the number of CPUs.
+    :param chunk_size: Number of sections rendered at a time by a process.
+    :return: The number of pages rendered, and the number of pages which were up to date.
+    """
+    columns = ["act_name", "previous", "current", "previous_link", "current_link"] + \
+        [column for metric in METRICS.values() for column in (metric.previous_column, metric.current_column)]
+    frame = pd.read_csv(path, index_col=0)
+    frame = frame[~frame.index.duplicated()][columns].reset_index()
+    frame[columns[:5]] = frame[columns[:5]].fillna("")
+    os.makedirs(os.path.join(output, SECTIONS_DIRECTORY), exist_ok=True)
+    manifest = _read_manifest(output)
+
+    hashes, pending = {}, []
+    for section in frame.to_dict("records"):
+        key = section["index"]
+        hashes[key] = content_hash(section)
+        entry = manifest.get(key)
+        if entry is None or entry["hash"] != hashes[key] or \
+                not os.path.exists(os.path.join(output, SECTIONS_DIRECTORY, f"{entry['slug']}.html")):
+            pending.append(section)
+
+    workers = workers or os.cpu_count() or 1
+    if len(pending) > chunk_size and workers > 1:
+        chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(_render_chunk, chunks, [output] * len(chunks)):
+                pass
+    else:
+        _render_chunk(pending, output)
+
+    for key, entry in manifest.items():
+        if key not in hashes:
+            for extension in (".html", ".json"):
+                stale = os.path.join(output, SECTIONS_DIRECTORY, f"{entry['slug']}{extension}")
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+    slugs = {key: section_slug(key) for key in hashes}
+    _write_index(slugs, output)
+    temporary = os.path.join(output, f"{MANIFEST_FILE}.tmp")
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump({key: {"slug": slugs[key], "hash": hashed} for key, hashed in hashes.items()}, file,
+                  ensure_ascii=False)
+    os.replace(temporary, os.path.join(output, MANIFEST_FILE))
+    return len(pending), len(hashes) - len(pending)
+
+
+def point_urls(url_base: str, path: str = DATA_PATH) -> int:
+    """
+    Points the `url` column of the dataset at `path` to the exported pages, as published under `url_base`.
+    The dataset is only rewritten if a link changed.
+    :return: The number of links changed.
+    """
+    frame = pd.read_csv(path, index_col=0)
+    urls = [static_url(key, url_base) for key in frame.index]
+    changed = sum(url != previous for url, previous in zip(urls, frame["url"]))
+    if changed:
+        frame["url"] = urls
+        temporary = f"{path}.tmp"
+        frame.to_csv(temporary, compression="gzip")
+        os.replace(temporary, path)
+    return changed
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Export the page of every section of the PLUS Explorer.")
+    parser.add_argument("--data", default=DATA_PATH, help="Path to the dataset.")
+    parser.add_argument("--output", default=EXPORT_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--url-base", help="Point the url column of the dataset at the pages published here.")
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+    rendered, skipped = export_sections(arguments.data, arguments.output, arguments.workers)
+    print(f"{rendered} pages rendered and {skipped} up to date in {arguments.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+    if arguments.url_base:
+        changed = point_urls(arguments.url_base, arguments.data)
+        print(f"{changed} links changed in {arguments.data}")
+
+        from store import META_FILE, STORE_PATH
+        if changed and arguments.data == DATA_PATH and os.path.exists(os.path.join(STORE_PATH, META_FILE)):
+            from store import build_store
+
+            print(f"Store written to {build_store()}")
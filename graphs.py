@@ -1,9 +1,14 @@
+import json
 from urllib.parse import urlencode
 
-import altair as alt
-import pandas as pd
 import streamlit as st
 
+from aggregate import AGGREGATE_THRESHOLD
+from charts import chart_data, chart_view, dashboard_view, pattern_view
+from metrics import METRICS
+from timeline import comparison_data, open_timeline
+from timing import finish_run, stage, start_run, write_summary
+
 st.set_page_config(
     page_title='PLUS Explorer - Graphs',
     page_icon='📊',
@@ -15,6 +20,7 @@ st.set_page_config(
 )
 
 st.title('PLUS Explorer - Graphs')
+start_run('graphs', st.experimental_get_query_params())
 
 with st.expander('Introduction'):
     st.write("""
@@ -43,7 +49,16 @@ I left them inside the dataset as it was important to show that not all sections
 
 # Load data
 
-dataset = pd.read_csv("data.csv.gz", index_col=0)
+with stage('load', 'chart_data'):
+    data = chart_data()
+
+
+def draw_chart(container, metric_key: str, kind: str = 'change'):
+    with stage('chart', f'{metric_key}.{kind}') as timed:
+        frame, spec = chart_view(metric_key, kind, data=comparison)
+        container.vega_lite_chart(frame, spec)
+        if timed:
+            timed.size = int(frame.memory_usage(deep=True).sum()) + len(json.dumps(spec))
 
 
 @st.cache
@@ -56,14 +71,47 @@ def get_url(index: str):
 st.write("## Select a readability score")
 
 selected = st.selectbox("Readability Score",
-                        ["Flesch Reading Ease", "Gunning FOG", "Automated Readability Index", "Dale-Chall",
-                         "Word Count"])
+                        [METRICS[key].name for key in
+                         ['flesch_reading_ease', 'gunning_fog', 'ari', 'dale-chall', 'lexicon_count']])
+
+# Versions of the timeline to compare, instead of the dataset
+
+comparison = None
+timeline = open_timeline()
+if timeline is not None and len(timeline.dates()) > 1 and st.checkbox("Compare the versions in force on two dates"):
+    dates = timeline.dates()
+    from_column, to_column = st.columns(2)
+    from_date = from_column.selectbox("From the versions in force on", dates, index=len(dates) - 2)
+    to_date = to_column.selectbox("To the versions in force on", dates, index=len(dates) - 1)
+    with stage('load', 'timeline'):
+        comparison = comparison_data(from_date, to_date)
+    st.caption(f"{comparison.index.size} sections were in force on both dates.")
+charted = data if comparison is None else comparison
+
+# Linked charts of every score, which filter each other in the browser
+
+dashboard = None
+if charted.index.size <= AGGREGATE_THRESHOLD and st.checkbox("Show every score in linked charts"):
+    with stage('chart', 'dashboard') as timed:
+        dashboard = dashboard_view(data=comparison)
+        st.vega_lite_chart(*dashboard)
+        if timed:
+            timed.size = int(dashboard[0].memory_usage(deep=True).sum()) + len(json.dumps(dashboard[1]))
+    st.caption("Drag a rectangle over the word count chart to show only those sections in the charts of every score. "
+               "Double-click to show every section again.")
+shown = None if dashboard else selected
 
 # Containers to (1) Introduce score, (2) display graph
 score_intro = st.container()
 score_display = st.container()
 
-if selected == "Word Count":
+if dashboard is None and charted.index.size > AGGREGATE_THRESHOLD:
+    score_display.caption(f"""
+    There are {charted.index.size} sections, so sections are grouped into bins.
+    Click on a bin to explore an example section in it.
+    """)
+
+if shown == "Word Count":
     score_intro.write("""
     ### Word Count
     
@@ -72,21 +120,9 @@ if selected == "Word Count":
     However small changes to the number of words alone is neutral IMO.
     """)
 
-    word_count_view = dataset[["previous_lexicon_count", "current_lexicon_count"]].reset_index()
-    word_count_view['diff'] = word_count_view.index.map(
-        lambda x: word_count_view["current_lexicon_count"][x] - word_count_view['previous_lexicon_count'][x])
-
-    base = alt.Chart(word_count_view)
-
-    heatmap = base.mark_rect().encode(
-        x=alt.X('current_lexicon_count:O', title='2020 Word Count', bin=alt.BinParams(step=100)),
-        y=alt.Y('diff:O', title='Change in Word Count'),
-        color="count()"
-    )
+    draw_chart(score_display, 'lexicon_count')
 
-    score_display.altair_chart(heatmap)
-
-if selected == "Flesch Reading Ease":
+if shown == "Flesch Reading Ease":
     score_intro.write("""
     ### Flesch reading ease
     
@@ -101,81 +137,18 @@ if selected == "Flesch Reading Ease":
     * Negative scores are possible under the formula.
     """)
 
-    fre_view = dataset[
-        ['current_flesch_reading_ease', 'previous_flesch_reading_ease', 'current_lexicon_count', 'url']].reset_index()
-
-    fre_view['diff'] = fre_view.index.map(
-        lambda x: fre_view["current_flesch_reading_ease"][x] - fre_view['previous_flesch_reading_ease'][x])
-
-    base = alt.Chart(fre_view)
-
-    heatmap = base.mark_circle(size=100).encode(
-        x=alt.X('current_lexicon_count', title='2020 Word Count'),
-        y=alt.Y('diff', title='Change in FRE', sort='-y'),
-        color=alt.Color('diff', scale=alt.Scale(scheme='pinkyellowgreen', domainMid=0, domainMin=-10, domainMax=10)),
-        tooltip=['index', "current_flesch_reading_ease", "diff"],
-        href='url:N'
-    ).properties(
-        width=800,
-        height=800
-    )
-
-    positive_line = base.mark_rule(color='red', opacity=0.3).encode(
-        y='y:Q',
-    ).transform_calculate(
-        y='5'
-    )
-    negative_line = base.mark_rule(color='red', opacity=0.3).encode(
-        y='y:Q',
-    ).transform_calculate(
-        y='-5'
-    )
-
     score_display.header('Change in FRE')
-
-    score_display.altair_chart(positive_line + negative_line + heatmap)
-
+    draw_chart(score_display, 'flesch_reading_ease', 'change')
     score_display.write('Red horizontal rules at Change of FRE = \u00B1 5 to show small changes.')
 
-    bars = base.mark_bar().encode(
-        x2=alt.X2('previous_flesch_reading_ease', title='Previous FRE'),
-        x=alt.X('current_flesch_reading_ease', title='2020 FRE'),
-        y=alt.Y('index', sort="-x", title='Section', axis=alt.Axis(labels=False)),
-        color=alt.Color('diff', scale=alt.Scale(scheme='pinkyellowgreen', domainMid=0, domainMin=-10, domainMax=10),
-                        title='Change in FRE'),
-        tooltip=['index', "current_flesch_reading_ease", "diff"],
-        href='url:N'
-    ).properties(
-        height=1200,
-        width=800
-    )
-
-    G10_line = base.mark_rule(color='red', opacity=0.3).encode(
-        x='x:Q',
-    ).transform_calculate(
-        x='50'
-    )
-    Pro_line = base.mark_rule(color='red', opacity=0.3).encode(
-        x='x:Q',
-    ).transform_calculate(
-        x='10'
-    )
-
-    line = base.mark_line().encode(
-        x=alt.X('current_flesch_reading_ease', title='2020 FRE'),
-        y=alt.Y('index', sort="-x", title='Section', axis=alt.Axis(labels=False)),
-    )
-
     score_display.header('FRE Scores of each Section (ordered)')
-
-    score_display.altair_chart(bars + G10_line + Pro_line + line)
-
+    draw_chart(score_display, 'flesch_reading_ease', 'ordered')
     score_display.write("""
     Red vertical rule at FRE = 60 to show ninth grade level.
     Red vertical rule at FRE = 10 to show professional reading level.
     """)
 
-if selected == "Gunning FOG":
+if shown == "Gunning FOG":
     score_intro.write("""
     ### Gunning Fog index
     
@@ -190,75 +163,15 @@ if selected == "Gunning FOG":
 
     """)
 
-    fog_view = dataset[['current_gunning_fog', 'previous_gunning_fog', 'current_lexicon_count', 'url']] \
-        .reset_index()
-
-    fog_view['diff'] = fog_view.index.map(
-        lambda x: fog_view["current_gunning_fog"][x] - fog_view['previous_gunning_fog'][x])
-
-    base = alt.Chart(fog_view)
-
-    heatmap = base.mark_circle(size=100).encode(
-        x=alt.X('current_lexicon_count', title='2020 Word Count'),
-        y=alt.Y('diff', title='Change in FOG', sort='descending'),
-        color=alt.Color('diff', scale=alt.Scale(scheme='pinkyellowgreen', domainMid=0, domainMin=-2, domainMax=2,
-                                                reverse=True)),
-        tooltip=['index', "current_gunning_fog", "diff"],
-        href='url:N'
-    ).properties(
-        width=800,
-        height=800
-    )
-
-    positive_line = base.mark_rule(color='red', opacity=0.3).encode(
-        y='y:Q',
-    ).transform_calculate(
-        y='0.5'
-    )
-    negative_line = base.mark_rule(color='red', opacity=0.3).encode(
-        y='y:Q',
-    ).transform_calculate(
-        y='-0.5'
-    )
-
     score_display.header('Changes in FOG Index')
-
-    score_display.altair_chart(positive_line + negative_line + heatmap)
-
+    draw_chart(score_display, 'gunning_fog', 'change')
     score_display.write('Red horizontal rules at Change of FRE = \u00B1 0.5 to show small changes.')
 
-    bars = base.mark_bar().encode(
-        x2=alt.X2('previous_gunning_fog', title='Previous FOG'),
-        x=alt.X('current_gunning_fog', title='2020 FOG'),
-        y=alt.Y('index', sort="x", title='Section', axis=alt.Axis(labels=False)),
-        color=alt.Color('diff',
-                        scale=alt.Scale(scheme='pinkyellowgreen', domainMid=0, domainMin=-2, domainMax=2, reverse=True),
-                        title='Change in FOG'),
-        tooltip=['index', "current_gunning_fog", "diff"],
-        href='url:N'
-    ).properties(
-        height=1200,
-        width=800
-    )
-
-    Pro_line = base.mark_rule(color='red', opacity=0.3).encode(
-        x='x:Q'
-    ).transform_calculate(
-        x='12'
-    )
-
-    line = base.mark_line().encode(
-        x=alt.X('current_gunning_fog', title='2020 FOG'),
-        y=alt.Y('index', sort="x", title='Section', axis=alt.Axis(labels=False)),
-    )
-
     score_display.header("FOG Index for each section (Ordered)")
-
-    score_display.altair_chart(Pro_line + bars + line)
-
+    draw_chart(score_display, 'gunning_fog', 'ordered')
     score_display.write("Red vertical rule at FOG = 12 to show documents for a general audience.")
 
-if selected == "Automated Readability Index":
+if shown == "Automated Readability Index":
     score_intro.write("""
     ### Automated Readability Index
     
@@ -271,73 +184,15 @@ if selected == "Automated Readability Index":
 
     """)
 
-    ari_view = dataset[['current_ari', 'previous_ari', 'current_lexicon_count', 'url']] \
-        .reset_index()
-
-    ari_view['diff'] = ari_view.index.map(
-        lambda x: ari_view["current_ari"][x] - ari_view['previous_ari'][x])
-
-    base = alt.Chart(ari_view)
-
-    heatmap = base.mark_circle(size=100).encode(
-        x=alt.X('current_lexicon_count', title='2020 Word Count'),
-        y=alt.Y('diff', title='Change in ARI', sort='descending'),
-        color=alt.Color('diff', scale=alt.Scale(scheme='pinkyellowgreen', domainMid=0, domainMin=-2, domainMax=2,
-                                                reverse=True)),
-        tooltip=['index', "current_ari", "diff"],
-        href='url:N'
-    ).properties(
-        width=800,
-        height=800
-    )
-
-    positive_line = base.mark_rule(color='red', opacity=0.3).encode(
-        y='y:Q',
-    ).transform_calculate(
-        y='0.5'
-    )
-    negative_line = base.mark_rule(color='red', opacity=0.3).encode(
-        y='y:Q',
-    ).transform_calculate(
-        y='-0.5'
-    )
-
     score_display.header('Changes in Automated Readability Index')
-
-    score_display.altair_chart(positive_line + negative_line + heatmap)
-
+    draw_chart(score_display, 'ari', 'change')
     score_display.write('Red horizontal rules at Change of ARI = \u00B1 0.5 to show small changes.')
 
-    bars = base.mark_bar().encode(
-        x2=alt.X2('previous_ari', title='Previous ARI'),
-        x=alt.X('current_ari', title='2020 ARI'),
-        y=alt.Y('index', sort="x", title='Section', axis=alt.Axis(labels=False)),
-        color=alt.Color('diff',
-                        scale=alt.Scale(scheme='pinkyellowgreen', domainMid=0, domainMin=-2, domainMax=2, reverse=True),
-                        title='Change in ARI'),
-        tooltip=['index', "current_ari", "diff"],
-        href='url:N'
-    ).properties(
-        height=1200,
-        width=800
-    )
-
-    G10_line = base.mark_rule(color='red', opacity=0.3).encode(
-        x='x:Q',
-    ).transform_calculate(
-        x='10'
-    )
-
-    line = base.mark_line().encode(
-        x=alt.X('current_ari', title='2020 ARI'),
-        y=alt.Y('index', sort="x", title='Section', axis=alt.Axis(labels=False)),
-    )
-
     score_display.header("Automated Readability Index for each section (Ordered)")
-    score_display.altair_chart(G10_line + bars + line)
+    draw_chart(score_display, 'ari', 'ordered')
     score_display.write("Red vertical rule at ARI = 10 to show Grade 10 / Secondary School readability.")
 
-if selected == "Dale-Chall":
+if shown == "Dale-Chall":
     score_intro.write("""
     ### Dale-Chall Readability Score
     
@@ -352,76 +207,36 @@ if selected == "Dale-Chall":
     Scores of 9 to 9.9 are considered easily understood by an average 13th to 15th-grade (college) student.
     """)
 
-    dc_view = dataset[['current_dale-chall', 'previous_dale-chall', 'current_lexicon_count', 'url']] \
-        .reset_index()
-
-    dc_view['diff'] = dc_view.index.map(
-        lambda x: dc_view["current_dale-chall"][x] - dc_view['previous_dale-chall'][x])
-
-    base = alt.Chart(dc_view)
-
-    heatmap = base.mark_circle(size=100).encode(
-        x=alt.X('current_lexicon_count', title='2020 Word Count'),
-        y=alt.Y('diff', title='Change in DC', sort='descending'),
-        color=alt.Color('diff', scale=alt.Scale(scheme='pinkyellowgreen', domainMid=0, reverse=True),
-                        title='Change in DC'),
-        tooltip=['index', "current_dale-chall", "diff"],
-        href='url:N'
-    ).properties(
-        width=800,
-        height=800
-    )
-
-    positive_line = base.mark_rule(color='red', opacity=0.3).encode(
-        y='y:Q',
-    ).transform_calculate(
-        y='0.5'
-    )
-    negative_line = base.mark_rule(color='red', opacity=0.3).encode(
-        y='y:Q',
-    ).transform_calculate(
-        y='-0.5'
-    )
-
     score_display.header('Changes in Dale-Chall Scores')
-    score_display.altair_chart(positive_line + negative_line + heatmap)
+    draw_chart(score_display, 'dale-chall', 'change')
     score_display.write('Red horizontal rules at Change of DC = \u00B1 0.5 to show small changes.')
 
-    bars = base.mark_bar().encode(
-        x2=alt.X2('previous_dale-chall', title='Previous DC'),
-        x=alt.X('current_dale-chall', title='2020 DC'),
-        y=alt.Y('index', sort="x", title='Section', axis=alt.Axis(labels=False)),
-        color=alt.Color('diff',
-                        scale=alt.Scale(scheme='pinkyellowgreen', domainMid=0, reverse=True),
-                        title='Change in DC'),
-        tooltip=['index', "current_dale-chall", "diff"],
-        href='url:N'
-    ).properties(
-        height=1200,
-        width=800
-    )
-
-    line = base.mark_line().encode(
-        x=alt.X('current_dale-chall', title='2020 DC'),
-        y=alt.Y('index', sort="x", title='Section', axis=alt.Axis(labels=False)),
-    )
-
-    G9_line = base.mark_rule(color='red', opacity=0.3).encode(
-        x='x:Q',
-    ).transform_calculate(
-        x='7.0'
-    )
-
-    G14_line = base.mark_rule(color='red', opacity=0.3).encode(
-        x='x:Q',
-    ).transform_calculate(
-        x='9.9'
-    )
-
     score_display.header("Dale-Chall scores for each section (Ordered)")
-    score_display.altair_chart(G9_line + G14_line + bars + line)
+    draw_chart(score_display, 'dale-chall', 'ordered')
     score_display.write("""
     Red vertical rule at DC = 7 to show easily understood by a secondary 3 student.
     
     Red vertical rule at DC = 9.9 to show easily understood by college student.
     """)
+
+# Rewrite patterns
+
+st.write("## Rewrite patterns")
+st.write("""
+The rewrites which were made to the most sections, such as "shall" to "must".
+Each bar is coloured by the mean change in the selected readability score of the sections with that rewrite.
+Click on a bar to explore an example section.
+""")
+
+pattern_kinds = {'All rewrites': None, 'Replacements': 'replace', 'Insertions': 'insert', 'Deletions': 'delete'}
+pattern_kind = st.radio("Show", list(pattern_kinds))
+selected_key = next(key for key, metric in METRICS.items() if metric.name == selected)
+with stage('chart', f'{selected_key}.patterns'):
+    patterns = pattern_view(selected_key, tag=pattern_kinds[pattern_kind])
+    if patterns is None:
+        st.caption("Run `python patterns.py` to find the rewrite patterns.")
+    else:
+        st.vega_lite_chart(*patterns)
+
+write_summary()
+finish_run()
@@ -0,0 +1,147 @@
+"""
+Batch ingestion of sections into the dataset.
+
+Reads pairs of previous and current versions of sections, cleans and scores them in a pool of processes, and appends
+them to `data.csv.gz`. Every batch is appended as a new GZIP member, so the existing data is never rewritten.
+The source texts and scores are recorded in the score store, so the sections can be rescored incrementally later
+(see `rescore.py`).
+
+    python ingest.py sections.jsonl
+    python ingest.py sections/ --workers 8
+
+The input is either a JSONL file with one section per line, or a directory of `.json` files, each holding a section
+or a list of sections. A section is an object with the fields `act_name`, `section` (the section number),
+`previous`, `previous_link`, `current` and `current_link`. Instead of `section`, an `index` field can give the
+key of the section in the dataset directly.
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import pandas as pd
+
+from dataset import DATA_PATH
+from ipynb.helpers import clean_text
+from metrics import METRICS
+from readability import score_text as readability_scores
+from rescore import ScoreStore
+from sections import explorer_url
+
+FIELDS = ('act_name', 'previous', 'previous_link', 'current', 'current_link')
+
+
+def section_key(record: dict) -> str:
+    """Returns the key of a section in the dataset, such as "Civil Law Act 1909 Section 6"."""
+    if record.get('index'):
+        return record['index']
+    return f"{record['act_name']} Section {record['section']}"
+
+
+def score_text(text: str) -> dict:
+    """Cleans `text` and returns it with its length and readability scores, keyed by column suffix."""
+    cleaned_text = clean_text(text)
+    return {'': cleaned_text, **{f'_{metric}': score for metric, score in readability_scores(cleaned_text).items()}}
+
+
+def score_record(record: dict) -> dict:
+    """Returns the row of the dataset for an input section."""
+    missing = [field for field in FIELDS if not record.get(field)]
+    if missing:
+        raise ValueError(f'Section {record.get("index") or record.get("section")} is missing: {", ".join(missing)}')
+    key = section_key(record)
+    row = {'index': key, 'act_name': record['act_name'],
+           'previous_link': record['previous_link'], 'current_link': record['current_link'],
+           'url': explorer_url(key)}
+    for version in ('previous', 'current'):
+        row.update({f'{version}{suffix}': value for suffix, value in score_text(record[version]).items()})
+    return row
+
+
+def read_records(source: str):
+    """Yields the sections in a JSONL file, or in the `.json` files of a directory."""
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith('.json'):
+                with open(os.path.join(source, name), encoding='utf-8') as file:
+                    content = json.load(file)
+                yield from content if isinstance(content, list) else [content]
+    else:
+        with open(source, encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_header(path: str = DATA_PATH) -> list[str]:
+    """Returns the columns of the dataset at `path`, in the order they are stored."""
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as file:
+        return next(csv.reader(file))
+
+
+def append_rows(rows: list[dict], header: list[str], path: str = DATA_PATH):
+    """Appends `rows` to the dataset at `path` as a new GZIP member, without reading or rewriting the file."""
+    with gzip.open(path, 'at', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=header, extrasaction='ignore')
+        writer.writerows(rows)
+
+
+def _batches(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def ingest(source: str, path: str = DATA_PATH, workers: int | None = None, batch_size: int = 500,
+           skip_existing: bool = True) -> int:
+    """
+    Scores the sections in `source` and appends them to the dataset at `path`.
+    :param source: A JSONL file, or a directory of `.json` files.
+    :param path: Path to the dataset.
+    :param workers: Number of processes scoring sections. Defaults to the number of CPUs.
+    :param batch_size: Number of sections appended at a time.
+    :param skip_existing: Skip sections whose key is already in the dataset.
+    :return: The number of sections appended.
+    """
+    header = read_header(path)
+    existing = set(pd.read_csv(path, usecols=[header[0]])[header[0]]) if skip_existing else set()
+
+    def new_records():
+        for record in read_records(source):
+            key = section_key(record)
+            if key not in existing:
+                existing.add(key)
+                yield record
+
+    appended = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor, ScoreStore() as store:
+        for batch in _batches(new_records(), batch_size):
+            chunksize = max(1, len(batch) // (4 * (workers or os.cpu_count() or 1)))
+            rows = list(executor.map(score_record, batch, chunksize=chunksize))
+            append_rows(rows, header, path)
+            for record, row in zip(batch, rows):
+                for version in ('previous', 'current'):
+                    scores = {metric: row[f'{version}_{metric}'] for metric in METRICS}
+                    store.add_row(row['index'], version, record[version], row[version], scores)
+            appended += len(rows)
+            print(f'{appended} sections appended')
+    return appended
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Score sections and append them to the PLUS Explorer dataset.')
+    parser.add_argument('source', help='A JSONL file, or a directory of .json files.')
+    parser.add_argument('--data', default=DATA_PATH, help='Path to the dataset.')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--include-existing', action='store_true',
+                        help='Append sections even if their key is already in the dataset.')
+    arguments = parser.parse_args()
+    ingest(arguments.source, arguments.data, arguments.workers, arguments.batch_size,
+           not arguments.include_existing)
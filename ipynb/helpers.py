@@ -1,19 +1,309 @@
 from __future__ import annotations
 
 import re
+from array import array
+from bisect import bisect_left
 
 tokenizer = re.compile(r"((?:[^()\s]+|[().?!-])\s*)")
 
 
 def tokenize_text(text: str) -> list[str]:
-    return re.findall(tokenizer, text)
+    return tokenizer.findall(text)
+
+
+class Vocabulary:
+    """
+    Integer IDs of tokens, shared by every text tokenized with it.
+    Texts are stored as compact arrays of IDs, and every distinct token is stored once however many texts contain it,
+    which saves memory when diffing many texts. It does not make diffing faster: the IDs are diffed as lists, which
+    takes about as long as diffing the tokens, and encoding adds to it. Tokens are turned back into text with `decode`.
+    Not thread safe.
+    """
+
+    def __init__(self):
+        self.ids: dict[str, int] = {}
+        self._tokens: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def encode(self, text: str) -> array:
+        """Returns the IDs of the tokens of `text`, as returned by `tokenize_text`, adding new tokens."""
+        ids, tokens = self.ids, self._tokens
+        result = array('I')
+        for token in tokenizer.findall(text):
+            token_id = ids.get(token)
+            if token_id is None:
+                token_id = ids[token] = len(tokens)
+                tokens.append(token)
+            result.append(token_id)
+        return result
+
+    @property
+    def tokens(self) -> list[str]:
+        """The tokens, indexed by ID."""
+        return self._tokens
+
+    def decode(self, ids) -> list[str]:
+        """Returns the tokens of `ids`."""
+        tokens = self.tokens
+        return [tokens[i] for i in ids]
+
+
+def intern_sequences(seq1: list[str], seq2: list[str]) -> tuple[list[int], list[int]]:
+    """Replaces every token in `seq1` and `seq2` with an integer ID, so that equal tokens get equal IDs."""
+    ids = {}
+    return [ids.setdefault(token, len(ids)) for token in seq1], [ids.setdefault(token, len(ids)) for token in seq2]
+
+
+def opcodes_from_blocks(blocks: list[tuple[int, int, int]], len1: int,
+                        len2: int) -> list[tuple[str, int, int, int, int]]:
+    """
+    Turns a list of matching blocks (i, j, size), in increasing order, into opcodes.
+    Same as `SequenceMatcher.get_opcodes`.
+    """
+    merged = []
+    for i, j, size in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        elif size:
+            merged.append((i, j, size))
+    merged.append((len1, len2, 0))
+
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in merged:
+        if i < ai and j < bj:
+            opcodes.append(('replace', i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(('delete', i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(('insert', i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(('equal', ai, i, bj, j))
+    return opcodes
+
+
+def _trim(seq1, seq2, lo1, hi1, lo2, hi2, blocks) -> tuple[int, int, int, int, tuple[int, int, int] | None]:
+    # Records the common prefix as a matching block, and returns the remaining range with the common suffix.
+    prefix = 0
+    while lo1 + prefix < hi1 and lo2 + prefix < hi2 and seq1[lo1 + prefix] == seq2[lo2 + prefix]:
+        prefix += 1
+    if prefix:
+        blocks.append((lo1, lo2, prefix))
+    lo1, lo2 = lo1 + prefix, lo2 + prefix
+    suffix = 0
+    while lo1 < hi1 - suffix and lo2 < hi2 - suffix and seq1[hi1 - suffix - 1] == seq2[hi2 - suffix - 1]:
+        suffix += 1
+    return lo1, hi1 - suffix, lo2, hi2 - suffix, (hi1 - suffix, hi2 - suffix, suffix) if suffix else None
+
+
+def _bisect(seq1, seq2, lo1, hi1, lo2, hi2) -> tuple[int, int] | None:
+    # Finds the middle snake of the shortest edit script (Myers, 1986) and returns the point to split the problem at.
+    len1, len2 = hi1 - lo1, hi2 - lo2
+    max_d = (len1 + len2 + 1) // 2
+    offset = max_d
+    length = 2 * max_d + 2
+    forward = [-1] * length
+    forward[offset + 1] = 0
+    backward = forward[:]
+    delta = len1 - len2
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    for d in range(max_d):
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < len1 and y1 < len2 and seq1[lo1 + x1] == seq2[lo2 + y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > len1:
+                k1end += 2
+            elif y1 > len2:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < length and backward[k2_offset] != -1 and x1 >= len1 - backward[k2_offset]:
+                    return lo1 + x1, lo2 + y1
+
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and backward[k2_offset - 1] < backward[k2_offset + 1]):
+                x2 = backward[k2_offset + 1]
+            else:
+                x2 = backward[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < len1 and y2 < len2 and seq1[hi1 - x2 - 1] == seq2[hi2 - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            backward[k2_offset] = x2
+            if x2 > len1:
+                k2end += 2
+            elif y2 > len2:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < length and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    if x1 >= len1 - x2:
+                        return lo1 + x1, lo2 + x1 - (k1_offset - offset)
+    return None
+
+
+def _myers_blocks(seq1, seq2, lo1, hi1, lo2, hi2, blocks):
+    stack = [(lo1, hi1, lo2, hi2, None)]
+    while stack:
+        lo1, hi1, lo2, hi2, block = stack.pop()
+        if block is not None:
+            blocks.append(block)
+            continue
+        lo1, hi1, lo2, hi2, suffix = _trim(seq1, seq2, lo1, hi1, lo2, hi2, blocks)
+        if suffix:
+            stack.append((0, 0, 0, 0, suffix))
+        if lo1 < hi1 and lo2 < hi2:
+            split = _bisect(seq1, seq2, lo1, hi1, lo2, hi2)
+            if split is not None:
+                x, y = split
+                stack.append((x, hi1, y, hi2, None))
+                stack.append((lo1, x, lo2, y, None))
+
+
+def _patience_blocks(seq1, seq2, lo1, hi1, lo2, hi2, blocks):
+    lo1, hi1, lo2, hi2, suffix = _trim(seq1, seq2, lo1, hi1, lo2, hi2, blocks)
+    if lo1 < hi1 and lo2 < hi2:
+        # Tokens which occur once in each range, paired by position and ordered by their position in seq1.
+        unique1, unique2 = {}, {}
+        for i in range(lo1, hi1):
+            unique1[seq1[i]] = -1 if seq1[i] in unique1 else i
+        for j in range(lo2, hi2):
+            unique2[seq2[j]] = -1 if seq2[j] in unique2 else j
+        anchors = sorted((i, unique2[token]) for token, i in unique1.items() if i >= 0 and unique2.get(token, -1) >= 0)
+
+        # Longest increasing subsequence of the anchors' positions in seq2, by patience sorting.
+        tails, tail_positions, previous = [], [], [-1] * len(anchors)
+        for position, (_, j) in enumerate(anchors):
+            pile = bisect_left(tails, j)
+            if pile:
+                previous[position] = tail_positions[pile - 1]
+            if pile == len(tails):
+                tails.append(j)
+                tail_positions.append(position)
+            else:
+                tails[pile] = j
+                tail_positions[pile] = position
+        chain = []
+        position = tail_positions[-1] if tail_positions else -1
+        while position != -1:
+            chain.append(anchors[position])
+            position = previous[position]
+        chain.reverse()
+
+        if chain:
+            for i, j in chain:
+                _patience_blocks(seq1, seq2, lo1, i, lo2, j, blocks)
+                blocks.append((i, j, 1))
+                lo1, lo2 = i + 1, j + 1
+            _patience_blocks(seq1, seq2, lo1, hi1, lo2, hi2, blocks)
+        else:
+            _myers_blocks(seq1, seq2, lo1, hi1, lo2, hi2, blocks)
+    if suffix:
+        blocks.append(suffix)
+
+
+def myers_opcodes(seq1: list, seq2: list) -> list[tuple[str, int, int, int, int]]:
+    """Returns the opcodes of a shortest edit script from `seq1` to `seq2`, using Myers' linear space algorithm."""
+    blocks = []
+    _myers_blocks(seq1, seq2, 0, len(seq1), 0, len(seq2), blocks)
+    return opcodes_from_blocks(blocks, len(seq1), len(seq2))
+
+
+def patience_opcodes(seq1: list, seq2: list) -> list[tuple[str, int, int, int, int]]:
+    """
+    Returns the opcodes of a patience diff from `seq1` to `seq2`.
+    Tokens which occur once in both sequences are matched first, and the gaps between them are diffed recursively.
+    Gaps without such tokens are diffed with Myers' algorithm.
+    """
+    blocks = []
+    _patience_blocks(seq1, seq2, 0, len(seq1), 0, len(seq2), blocks)
+    return opcodes_from_blocks(blocks, len(seq1), len(seq2))
+
+
+def difflib_opcodes(seq1: list, seq2: list, autojunk: bool = True) -> list[tuple[str, int, int, int, int]]:
+    """Returns the opcodes found by `difflib.SequenceMatcher`."""
+    from difflib import SequenceMatcher
+    return SequenceMatcher(None, seq1, seq2, autojunk=autojunk).get_opcodes()
+
+
+DIFF_BACKENDS = {
+    'difflib': difflib_opcodes,
+    'myers': myers_opcodes,
+    'patience': patience_opcodes,
+}
+
+
+def markdown_styles(style: str) -> dict[str, tuple[str, str]]:
+    """Returns the opening and closing tags of insertions and deletions for a `markdown_style`."""
+    if style == 'none':
+        return {"ins": ('ins', 'ins'), "del": ('del', 'del')}
+    return {"ins": ('span style="color:red;font-weight:700;"', 'span'),
+            "del": ('span style="color:red;font-weight:700;text-decoration:line-through;"', 'span')}
+
+
+def _ends_paragraph(token: str) -> bool:
+    return '\n' in token or token.rstrip()[-1:] in ('.', ';', ':')
+
+
+def markdown_paragraphs(seq1: list[str], seq2: list[str], opcodes: list[tuple[str, int, int, int, int]],
+                        paragraph_length: int = 1000, markdown_style: str = 'red'):
+    """
+    Yields the delta between two sequences of tokens in markdown format, a paragraph at a time.
+    A paragraph ends at the first end of a line, a sentence or a clause after `paragraph_length` characters,
+    splitting the changes across paragraphs if needed. Joined together, the paragraphs render the same text as
+    `Redlines.output_markdown`.
+    :return: An iterator of (changed, markdown) pairs, where `changed` is False if the paragraph has no changes.
+    """
+    md_styles = markdown_styles(markdown_style)
+    parts, length, changed = [], 0, False
+
+    def markup(style: str | None, run: list[str]) -> str:
+        if style is None:
+            return "".join(run)
+        return f"<{md_styles[style][0]}>{''.join(run)}</{md_styles[style][1]}>"
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            spans = [(None, seq1[i1:i2])]
+        else:
+            spans = [('del', seq1[i1:i2]), ('ins', seq2[j1:j2])]
+        for style, tokens in spans:
+            run = []
+            for token in tokens:
+                run.append(token)
+                length += len(token)
+                if length >= paragraph_length and _ends_paragraph(token):
+                    parts.append(markup(style, run))
+                    yield changed or style is not None, "".join(parts)
+                    parts, run, length, changed = [], [], 0, False
+            if run:
+                parts.append(markup(style, run))
+                changed = changed or style is not None
+    if parts:
+        yield changed, "".join(parts)
 
 
 class Redlines:
     _source: str = None
     _test: str = None
-    _seq1: list[str] = None
-    _seq2: list[str] = None
+    # Tokens of the source and test, or their IDs in the `vocabulary` option if it is set.
+    _seq1: list[str] | array = None
+    _seq2: list[str] | array = None
+    _opcodes: list[tuple[str, int, int, int, int]] = None
 
     @property
     def source(self):
@@ -26,7 +316,8 @@ class Redlines:
     @source.setter
     def source(self, value):
         self._source = value
-        self._seq1 = tokenize_text(value)
+        self._seq1 = self._tokenize(value)
+        self._opcodes = None
 
     @property
     def test(self):
@@ -36,7 +327,8 @@ class Redlines:
     @test.setter
     def test(self, value):
         self._test = value
-        self._seq2 = tokenize_text(value)
+        self._seq2 = self._tokenize(value)
+        self._opcodes = None
 
     def __init__(self, source: str, test: str | None = None, **options):
         """
@@ -44,55 +336,89 @@ class Redlines:
         which look like track changes in Microsoft Word.
         :param source: The source text to be used as a basis for comparison.
         :param test: Optional test text to compare with the source.
+        :param options: `markdown_style` ("red" or "none"), `backend` ("difflib", "myers" or "patience"),
+            `autojunk` (passed to `SequenceMatcher` by the "difflib" backend) and `vocabulary`, a `Vocabulary` to
+            store the tokens as IDs in. Share a vocabulary between the `Redlines` of many texts to diff a corpus in less
+            memory.
         """
-        self.source = source
         self.options = options
+        self.source = source
         if test:
             self.test = test
             self.compare()
 
+    @property
+    def tokens(self) -> tuple[list[str], list[str] | None]:
+        """The tokens of `source` and of `test`, as text."""
+        return self._tokens(self._seq1), self._tokens(self._seq2) if self._seq2 is not None else None
+
+    def _tokenize(self, text: str) -> list[str] | array:
+        vocabulary = self.options.get('vocabulary')
+        return vocabulary.encode(text) if vocabulary is not None else tokenize_text(text)
+
+    def _tokens(self, seq: list[str] | array) -> list[str]:
+        vocabulary = self.options.get('vocabulary')
+        return vocabulary.decode(seq) if vocabulary is not None else seq
+
     @property
     def opcodes(self) -> list[tuple[str, int, int, int, int]]:
         """
         Return list of 5-tuples describing how to turn `source` into `test`.
-        Similar to `SequenceMatcher.get_opcodes`
+        Similar to `SequenceMatcher.get_opcodes`.
+        The opcodes are computed once and kept until `source`, `test` or the options change.
+        The algorithm is selected with the `backend` option: "difflib" (default), "myers" or "patience".
+        With a `vocabulary`, the same backends diff lists of token IDs, in about the same time as the tokens.
         """
         if self._seq2 is None:
             raise ValueError('No test string was provided when the function was called, or during initialisation.')
 
-        from difflib import SequenceMatcher
-        matcher = SequenceMatcher(None, self._seq1, self._seq2)
-        return matcher.get_opcodes()
+        if self._opcodes is None:
+            backend = self.options.get('backend', 'difflib')
+            if backend not in DIFF_BACKENDS:
+                raise ValueError(f'Unknown diff backend: {backend}. Choose from {", ".join(DIFF_BACKENDS)}.')
+            if self._seq1 == self._seq2:
+                self._opcodes = [('equal', 0, len(self._seq1), 0, len(self._seq2))] if self._seq1 else []
+            elif isinstance(self._seq1, array):
+                # The backends are given lists of IDs, which only live while diffing, so only memory is saved.
+                seq1, seq2 = self._seq1.tolist(), self._seq2.tolist()
+                if backend == 'difflib':
+                    self._opcodes = difflib_opcodes(seq1, seq2, autojunk=self.options.get('autojunk', True))
+                else:
+                    self._opcodes = DIFF_BACKENDS[backend](seq1, seq2)
+            elif backend == 'difflib':
+                self._opcodes = difflib_opcodes(self._seq1, self._seq2, autojunk=self.options.get('autojunk', True))
+            else:
+                self._opcodes = DIFF_BACKENDS[backend](*intern_sequences(self._seq1, self._seq2))
+        return self._opcodes
 
     @property
     def output_markdown(self) -> str:
         """Returns the delta in markdown format."""
         result = []
-        style = 'red'
-
-        if self.options.get('markdown_style'):
-            style = self.options['markdown_style']
-
-        if style == 'none':
-            md_styles = {"ins": ('ins', 'ins'), "del": ('del', 'del')}
-        elif 'red':
-            md_styles = {"ins": ('span style="color:red;font-weight:700;"', 'span'),
-                         "del": ('span style="color:red;font-weight:700;text-decoration:line-through;"', 'span')}
+        md_styles = markdown_styles(self.options.get('markdown_style') or 'red')
+        seq1, seq2 = self._tokens(self._seq1), self._tokens(self._seq2)
 
         for tag, i1, i2, j1, j2 in self.opcodes:
             if tag == 'equal':
-                result.append("".join(self._seq1[i1:i2]))
+                result.append("".join(seq1[i1:i2]))
             elif tag == 'insert':
-                result.append(f"<{md_styles['ins'][0]}>{''.join(self._seq2[j1:j2])}</{md_styles['ins'][1]}>")
+                result.append(f"<{md_styles['ins'][0]}>{''.join(seq2[j1:j2])}</{md_styles['ins'][1]}>")
             elif tag == 'delete':
-                result.append(f"<{md_styles['del'][0]}>{''.join(self._seq1[i1:i2])}</{md_styles['del'][1]}>")
+                result.append(f"<{md_styles['del'][0]}>{''.join(seq1[i1:i2])}</{md_styles['del'][1]}>")
             elif tag == 'replace':
                 result.append(
-                    f"<{md_styles['del'][0]}>{''.join(self._seq1[i1:i2])}</{md_styles['del'][1]}>"
-                    f"<{md_styles['ins'][0]}>{''.join(self._seq2[j1:j2])}</{md_styles['ins'][1]}>")
+                    f"<{md_styles['del'][0]}>{''.join(seq1[i1:i2])}</{md_styles['del'][1]}>"
+                    f"<{md_styles['ins'][0]}>{''.join(seq2[j1:j2])}</{md_styles['ins'][1]}>")
 
         return "".join(result)
 
+    def markdown_paragraphs(self, paragraph_length: int = 1000):
+        """
+        Yields the delta in markdown format a paragraph at a time. See `markdown_paragraphs`.
+        """
+        return markdown_paragraphs(self._tokens(self._seq1), self._tokens(self._seq2), self.opcodes, paragraph_length,
+                                   self.options.get('markdown_style') or 'red')
+
     def compare(self, test: str | None = None, output: str = "markdown", **options):
 
         """
@@ -110,24 +436,51 @@ class Redlines:
             raise ValueError('No test string was provided when the function was called, or during initialisation.')
 
         if options:
+            vocabulary = self.options.get('vocabulary')
             self.options = options
+            self._opcodes = None
+            if options.get('vocabulary') is not vocabulary:
+                self.source = self.source
+                if self.test is not None:
+                    self.test = self.test
 
         if output == 'markdown':
             return self.output_markdown
 
 
+# Version of the rules of `clean_text`. Increase it whenever they change, so stored texts are cleaned again
+# (see `rescore.py`).
+CLEANER_VERSION = 1
+
+
+# The rules of `clean_text`, compiled once. A rule is only applied if the text contains what it removes.
+# Subclause notation at the start of a line, such as "(a) ".
+_subclause_rule = re.compile(r'^\(\w*\)\s+', flags=re.MULTILINE)
+# Clause notation at the start of the text, such as "12A.—(1) ".
+_clause_rule = re.compile(r'^\d+\w?\.(—\(1\))?\s+')
+_indent_rule = re.compile(r'^\s+', flags=re.MULTILINE)
+# Amendment info at the end of a line, such as "[Act5]".
+_amendment_rule = re.compile(r'\[\w+]$', flags=re.MULTILINE)
+_line_break_rule = re.compile(r'[\t\n\r\f\v]')
+
+
 def clean_text(text: str) -> str:
-    import re
     # Remove subclause notations
-    cleaned_text = re.sub(r'^\(\w*\)\s+', '', text, flags=re.MULTILINE)
+    if '(' in text:
+        text = _subclause_rule.sub('', text)
     # Remove clause notation at beginning of clause
-    cleaned_text_1 = re.sub(r'^\d+\w?\.(—\(1\))?\s+', '', cleaned_text)
-    # Remove extra spacing at start of line
-    cleaned_text_2 = re.sub(r'^\s+', '', cleaned_text_1, flags=re.MULTILINE)
+    clause = _clause_rule.match(text)
+    if clause:
+        text = text[clause.end():]
+    # Remove extra spacing at start of line. Without line breaks, it is only at the start of the text, which `strip`
+    # removes.
+    if '\n' in text:
+        text = _indent_rule.sub('', text)
     # Remove amendment info
-    cleaned_text_3 = re.sub(r'\[\w+]$', '', cleaned_text_2, flags=re.MULTILINE)
+    if ']' in text:
+        text = _amendment_rule.sub('', text)
     # Remove extra spaces
-    return re.sub(r'[\t\n\r\f\v]', ' ', cleaned_text_3).strip()
+    return _line_break_rule.sub(' ', text).strip()
 
 
 def calculate_stats(cleaned_text: str):
@@ -0,0 +1,55 @@
+"""
+Registry of the readability metrics in the dataset.
+
+Every metric has a `previous_<key>` and a `current_<key>` column. `add_deltas` adds the change between them as a
+`diff_<key>` column, computed for every row at once when the dataset is loaded.
+"""
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import pandas as pd
+
+
+class Metric(NamedTuple):
+    key: str
+    name: str
+    abbreviation: str
+    # "normal" if a higher score is easier to read, "inverse" if it is harder and "off" if neither.
+    # Same as the `delta_color` of `st.metric`.
+    delta_color: str
+
+    @property
+    def previous_column(self) -> str:
+        return f"previous_{self.key}"
+
+    @property
+    def current_column(self) -> str:
+        return f"current_{self.key}"
+
+    @property
+    def diff_column(self) -> str:
+        return f"diff_{self.key}"
+
+
+METRICS = {metric.key: metric for metric in (
+    Metric("flesch_reading_ease", "Flesch Reading Ease", "FRE", "normal"),
+    Metric("gunning_fog", "Gunning FOG", "FOG", "inverse"),
+    Metric("ari", "Automated Readability Index", "ARI", "inverse"),
+    Metric("dale-chall", "Dale-Chall", "DC", "inverse"),
+    Metric("lexicon_count", "Word Count", "Words", "off"),
+    Metric("len", "Length of Section (Characters)", "Length", "off"),
+    Metric("sentence_count", "No of Sentences", "Sentences", "off"),
+)}
+
+
+def add_deltas(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds a `diff_<key>` column to `frame` for every metric whose previous and current columns are in `frame`.
+    :param frame: The dataset, or a selection of its columns.
+    :return: `frame`, with the diff columns added.
+    """
+    for metric in METRICS.values():
+        if metric.previous_column in frame.columns and metric.current_column in frame.columns:
+            frame[metric.diff_column] = frame[metric.current_column] - frame[metric.previous_column]
+    return frame
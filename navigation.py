@@ -0,0 +1,75 @@
+"""
+Random browsing of the Section Explorer.
+
+Every session gets its own shuffled order of the sections, kept in its session state. "Random" moves to the next
+section in that order, so no list of keys is built and no section is shown twice before every section has been shown.
+When a section is shown, the texts of the next section in the order are loaded and diffed in a background thread,
+so its diff is already in the diff cache shared by every session (see `diffs.py`) when "Random" is clicked.
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dataset import DATA_PATH, load_text
+from diffs import get_diff
+
+SESSION_KEY = "random_order"
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+_lock = threading.Lock()
+_pending: set[str] = set()
+
+
+class RandomOrder:
+    """A shuffled order of the rows of the dataset, and how far a session has gone through it."""
+
+    def __init__(self, size: int, seed: int | None = None):
+        self.size = size
+        self._generator = np.random.default_rng(seed)
+        self._order = self._generator.permutation(size).astype(np.int32)
+        self._position = 0
+
+    def peek(self) -> int:
+        """Returns the row of the next section, without moving to it."""
+        return int(self._order[self._position])
+
+    def next(self) -> int:
+        """Returns the row of the next section and moves to it. The order is shuffled again once it is exhausted."""
+        row = self.peek()
+        self._position += 1
+        if self._position == self.size:
+            self._order = self._generator.permutation(self.size).astype(np.int32)
+            self._position = 0
+        return row
+
+
+def session_order(session_state, size: int) -> RandomOrder:
+    """
+    Returns the random order of the session, creating it on the first call or if the number of sections changed.
+    :param session_state: The session state, such as `st.session_state`.
+    :param size: Number of sections.
+    """
+    order = session_state[SESSION_KEY] if SESSION_KEY in session_state else None
+    if order is None or order.size != size:
+        order = session_state[SESSION_KEY] = RandomOrder(size)
+    return order
+
+
+def _prefetch(key: str, path: str):
+    try:
+        get_diff(load_text("previous", key, path), load_text("current", key, path))
+    finally:
+        with _lock:
+            _pending.discard(key)
+
+
+def prefetch(key: str, path: str = DATA_PATH):
+    """Diffs the section `key` in a background thread, unless it is being diffed already."""
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    _executor.submit(_prefetch, key, path)
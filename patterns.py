@@ -0,0 +1,186 @@
+"""
+Rewrite patterns found across the whole dataset.
+
+The revision applied the same rewrites to many sections, such as "shall" to "must". This module diffs every
+section, takes every span of tokens which was replaced, inserted or deleted, and counts how often every rewrite
+occurs. Every pattern also gets the mean change in every metric of the sections it occurs in, so rewrites can be
+compared by their effect on readability.
+
+The dataset is read in chunks, and the chunks are diffed in a pool of processes, a few chunks at a time. Spans
+longer than `MAX_SPAN_TOKENS` are rewrites of whole passages rather than patterns, and are not counted. At most
+`max_patterns` patterns are kept, so memory stays bounded on any dataset: once there are more, the patterns with the
+fewest sections are dropped, as in the space-saving algorithm. Every pattern found in more sections than any dropped
+pattern is kept. A pattern which was dropped and found again is only counted from then on, so its number of sections
+is short by at most the most sections of a pattern dropped before it was found again.
+
+Write the table of patterns (`patterns.csv.gz`), which the Graph Explorer reads, with:
+
+    python patterns.py [--workers 8]
+"""
+from __future__ import annotations
+
+import heapq
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_PATH, memoize
+from ipynb.helpers import Redlines, Vocabulary
+from metrics import METRICS
+
+PATTERNS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patterns.csv.gz")
+
+# Spans of more tokens than this are not counted as patterns.
+MAX_SPAN_TOKENS = 8
+
+
+def span_text(tokens: list[str]) -> str:
+    """Returns the text of a span of tokens, in lowercase and with its whitespace collapsed."""
+    return " ".join("".join(tokens).split()).lower()
+
+
+def section_patterns(previous: str, current: str, vocabulary: Vocabulary | None = None) -> Counter:
+    """
+    Counts the rewrites from `previous` to `current`, keyed by (tag, text before, text after).
+    :param vocabulary: Optional `Vocabulary` shared by the sections of a chunk, to keep their tokens as IDs.
+    """
+    redline = Redlines(previous, vocabulary=vocabulary)
+    redline.test = current
+    before, after = redline.tokens
+    found = Counter()
+    for tag, i1, i2, j1, j2 in redline.opcodes:
+        if tag != 'equal' and max(i2 - i1, j2 - j1) <= MAX_SPAN_TOKENS:
+            found[(tag, span_text(before[i1:i2]), span_text(after[j1:j2]))] += 1
+    return found
+
+
+def mine_chunk(chunk: pd.DataFrame) -> dict[tuple, list]:
+    """
+    Counts the rewrite patterns in a chunk of the dataset.
+    :return: For every pattern, the number of occurrences and of sections, the sum of the change in every metric
+        over those sections and the key of the first of them.
+    """
+    deltas = np.column_stack([chunk[metric.current_column].to_numpy(dtype=float)
+                              - chunk[metric.previous_column].to_numpy(dtype=float) for metric in METRICS.values()])
+    table = {}
+    vocabulary = Vocabulary()
+    for key, previous, current, delta in zip(chunk.index, chunk["previous"].fillna(""),
+                                             chunk["current"].fillna(""), deltas):
+        for pattern, occurrences in section_patterns(previous, current, vocabulary).items():
+            entry = table.get(pattern)
+            if entry is None:
+                table[pattern] = [occurrences, 1, np.nan_to_num(delta), key]
+            else:
+                entry[0] += occurrences
+                entry[1] += 1
+                entry[2] = entry[2] + np.nan_to_num(delta)
+    return table
+
+
+def _merge(table: dict, chunk_table: dict, max_patterns: int, dropped: int) -> int:
+    """
+    Adds the patterns of a chunk to `table`, then drops the patterns which may have the fewest sections until there
+    are at most `max_patterns`. A pattern may have been in up to `dropped` sections when it was last dropped, so a
+    pattern which is not in `table` yet may have that many more sections than it is found in.
+    :return: The most sections a pattern which is not in `table` may have been found in.
+    """
+    for pattern, (occurrences, sections, delta, key) in chunk_table.items():
+        entry = table.get(pattern)
+        if entry is None:
+            table[pattern] = [occurrences, sections, delta, key, dropped]
+        else:
+            entry[0] += occurrences
+            entry[1] += sections
+            entry[2] = entry[2] + delta
+    if len(table) > max_patterns:
+        # Of the patterns which may have as few sections, the ones found first are dropped first.
+        for pattern, entry in heapq.nsmallest(len(table) - max_patterns, table.items(),
+                                              key=lambda item: item[1][1] + item[1][4]):
+            dropped = max(dropped, entry[1] + entry[4])
+            del table[pattern]
+    return dropped
+
+
+def _chunks(path: str, chunk_size: int):
+    columns = {"previous", "current"} | {column for metric in METRICS.values()
+                                         for column in (metric.previous_column, metric.current_column)}
+    with pd.read_csv(path, index_col=0, usecols=lambda column: column in columns or column == "index",
+                     chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def mine_patterns(path: str = DATA_PATH, workers: int | None = None, chunk_size: int = 200,
+                  max_patterns: int = 200_000) -> pd.DataFrame:
+    """
+    Counts the rewrite patterns in every section of the dataset at `path`.
+    :param path: Path to the dataset.
+    :param workers: Number of processes diffing sections. Defaults to the number of CPUs.
+    :param chunk_size: Number of sections read and diffed at a time by a process.
+    :param max_patterns: Number of patterns kept. Above it, the patterns with the fewest sections are dropped.
+    :return: One row per pattern with its `tag` ("replace", "insert" or "delete"), the text `before` and `after`,
+        the number of `occurrences` and of `sections` it occurs in, the mean change in every metric of those
+        sections (as `diff_<key>` columns) and an `example` section, ordered by number of sections.
+    """
+    workers = workers or os.cpu_count() or 1
+    table, dropped = {}, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for chunk in _chunks(path, chunk_size):
+            pending.append(executor.submit(mine_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                dropped = _merge(table, pending.pop(0).result(), max_patterns, dropped)
+        for future in pending:
+            dropped = _merge(table, future.result(), max_patterns, dropped)
+
+    columns = ["tag", "before", "after", "occurrences", "sections",
+               *(metric.diff_column for metric in METRICS.values()), "example"]
+    rows = [(*pattern, occurrences, sections, *(delta / sections), key)
+            for pattern, (occurrences, sections, delta, key, _) in table.items()]
+    frame = pd.DataFrame(rows, columns=columns)
+    return frame.sort_values(["sections", "occurrences"], ascending=False, kind="stable", ignore_index=True)
+
+
+def pattern_label(tag: str, before: str, after: str) -> str:
+    """Returns a short description of a pattern, such as "shall → must"."""
+    if tag == "insert":
+        return f"+ {after}"
+    if tag == "delete":
+        return f"− {before}"
+    return f"{before} → {after}"
+
+
+def load_patterns(path: str = PATTERNS_PATH) -> pd.DataFrame | None:
+    """
+    Returns the table of patterns written by `python patterns.py`, with a `pattern` column describing every pattern.
+    It is read once per version of the file. Returns None if the table has not been written.
+    """
+    if not os.path.exists(path):
+        return None
+
+    def read():
+        frame = pd.read_csv(path, keep_default_na=False)
+        labels = map(pattern_label, frame["tag"], frame["before"], frame["after"])
+        frame.insert(0, "pattern", list(labels))
+        return frame
+
+    return memoize("patterns", read, path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Count the rewrite patterns in the PLUS Explorer dataset.")
+    parser.add_argument("--data", default=DATA_PATH, help="Path to the dataset.")
+    parser.add_argument("--output", default=PATTERNS_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+    patterns = mine_patterns(arguments.data, arguments.workers, arguments.chunk_size)
+    patterns.to_csv(arguments.output, index=False)
+    print(f"{len(patterns.index)} patterns written to {arguments.output} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,132 @@
+"""
+Statistics of every metric over the whole dataset.
+
+`CorpusStatistics` keeps the sorted values of the previous, current and diff column of every metric, so the rank of
+a score among all sections, a histogram or a median is found by binary search instead of a scan of the column.
+It is built once per version of the dataset (see `corpus_statistics`).
+"""
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_PATH, load_dataset, memoize
+from metrics import METRICS, Metric
+
+
+class Summary(NamedTuple):
+    count: int
+    mean: float
+    median: float
+    minimum: float
+    maximum: float
+
+
+def _columns(metric: Metric) -> tuple[str, str, str]:
+    return metric.previous_column, metric.current_column, metric.diff_column
+
+
+class CorpusStatistics:
+    """Sorted values of the previous, current and diff column of every metric. Missing values are left out."""
+
+    def __init__(self, frame: pd.DataFrame):
+        """:param frame: The dataset, with the previous, current and diff columns of every metric."""
+        self._sorted = {}
+        self._means = {}
+        for metric in METRICS.values():
+            for column in _columns(metric):
+                values = frame[column].to_numpy(dtype=float)
+                values = np.sort(values[np.isfinite(values)])
+                self._sorted[column] = values
+                self._means[column] = float(values.mean()) if len(values) else float("nan")
+
+    def values(self, column: str) -> np.ndarray:
+        """Returns the values of `column` in increasing order."""
+        return self._sorted[column]
+
+    def share_below(self, column: str, value: float) -> float:
+        """Returns the share of sections whose value in `column` is lower than `value`."""
+        values = self._sorted[column]
+        return np.searchsorted(values, value, side="left") / len(values) if len(values) else float("nan")
+
+    def share_above(self, column: str, value: float) -> float:
+        """Returns the share of sections whose value in `column` is higher than `value`."""
+        values = self._sorted[column]
+        return 1 - np.searchsorted(values, value, side="right") / len(values) if len(values) else float("nan")
+
+    def percentile_rank(self, column: str, value: float) -> float:
+        """Returns the percentile rank of `value` in `column`, between 0 and 100. Ties count as half below."""
+        values = self._sorted[column]
+        if not len(values):
+            return float("nan")
+        below = np.searchsorted(values, value, side="left")
+        ties = np.searchsorted(values, value, side="right") - below
+        return 100 * (below + ties / 2) / len(values)
+
+    def better_than(self, metric_key: str, score: float, column: str | None = None) -> float:
+        """
+        Returns the share of sections which `score` is more readable than.
+        :param metric_key: A metric whose `delta_color` is "normal" (higher is easier) or "inverse".
+        :param score: The score of a section.
+        :param column: Column to compare `score` with. Defaults to the current scores.
+            Pass the diff column to compare a change in score.
+        """
+        metric = METRICS[metric_key]
+        column = column or metric.current_column
+        if metric.delta_color == "normal":
+            return self.share_below(column, score)
+        if metric.delta_color == "inverse":
+            return self.share_above(column, score)
+        raise ValueError(f"{metric.name} is not a readability score")
+
+    def share_improved(self, metric_key: str) -> float:
+        """
+        Returns the share of sections whose score in a readability metric improved: whose diff is above zero if a
+        higher score is easier to read, or below zero if it is harder.
+        """
+        metric = METRICS[metric_key]
+        if metric.delta_color == "normal":
+            return self.share_above(metric.diff_column, 0)
+        if metric.delta_color == "inverse":
+            return self.share_below(metric.diff_column, 0)
+        raise ValueError(f"{metric.name} is not a readability score")
+
+    def quantile(self, column: str, q: float) -> float:
+        """Returns the `q` quantile (between 0 and 1) of `column`, with linear interpolation."""
+        values = self._sorted[column]
+        if not len(values):
+            return float("nan")
+        position = q * (len(values) - 1)
+        lower = int(np.floor(position))
+        upper = min(lower + 1, len(values) - 1)
+        return float(values[lower] + (values[upper] - values[lower]) * (position - lower))
+
+    def summary(self, column: str) -> Summary:
+        values = self._sorted[column]
+        if not len(values):
+            return Summary(0, *(float("nan"),) * 4)
+        return Summary(len(values), self._means[column], self.quantile(column, 0.5),
+                       float(values[0]), float(values[-1]))
+
+    def histogram(self, column: str, bins: int | np.ndarray = 20) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the number of sections in every bin of `column`, and the edges of the bins, like `np.histogram`.
+        :param bins: Number of bins of equal width, or their edges in increasing order.
+        """
+        values = self._sorted[column]
+        if np.ndim(bins) == 0:
+            low, high = (values[0], values[-1]) if len(values) else (0.0, 1.0)
+            bins = np.linspace(low, high if high > low else low + 1, int(bins) + 1)
+        edges = np.asarray(bins, dtype=float)
+        positions = np.searchsorted(values, edges, side="left")
+        # The last bin includes its upper edge.
+        positions[-1] = np.searchsorted(values, edges[-1], side="right")
+        return np.diff(positions), edges
+
+
+def corpus_statistics(path: str = DATA_PATH) -> CorpusStatistics:
+    """Returns the statistics of the dataset at `path`, computed once per version of the dataset."""
+    columns = [column for metric in METRICS.values() for column in (metric.previous_column, metric.current_column)]
+    return memoize("corpus_statistics", lambda: CorpusStatistics(load_dataset(path, columns)), path)
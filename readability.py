@@ -0,0 +1,188 @@
+"""
+Single-pass readability scores.
+
+`textstat` computes every score separately, so scoring a text with five metrics tokenizes it and counts its syllables
+several times. This module counts the words, sentences, syllables and difficult words of a text once, and derives
+every score in the dataset from those counts, following the formulas of `textstat` 0.7.2. Syllables are counted
+once per distinct word and shared by every text.
+
+`tests/test_readability.py` checks that the scores match `textstat` on the dataset. Compare and time both with:
+
+    python readability.py
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+import string
+from functools import lru_cache
+from typing import NamedTuple
+
+from pyphen import Pyphen
+
+punctuation = re.compile(f'[{re.escape(string.punctuation)}]')
+sentence_separator = re.compile(r' *[\.\?!][\'"\)\]]*[ |\n](?=[A-Z])')
+word_pattern = re.compile(r"[\w\='‘’]+")
+
+# Version of the scores computed by this module. Increase it whenever a formula or count changes, so stored scores
+# are computed again (see `rescore.py`).
+METRICS_VERSION = 1
+
+# Minimum number of syllables of a difficult word in the Gunning FOG index.
+FOG_SYLLABLE_THRESHOLD = 3
+
+_pyphen = Pyphen(lang='en_US')
+
+
+class TextCounts(NamedTuple):
+    length: int
+    characters: int
+    words: int
+    sentences: int
+    syllables: int
+    # Distinct words which are not in the Dale-Chall list of easy words,
+    # and those of them with at least `FOG_SYLLABLE_THRESHOLD` syllables.
+    unfamiliar_words: int
+    difficult_words: int
+
+
+def legacy_round(number: float, points: int = 0) -> float:
+    """Rounds half away from zero, like `textstat`."""
+    p = 10 ** points
+    return float(math.floor((number * p) + math.copysign(0.5, number))) / p
+
+
+@lru_cache(maxsize=None)
+def easy_words() -> frozenset[str]:
+    """Returns the Dale-Chall list of easy words shipped with `textstat`."""
+    import textstat
+    path = os.path.join(os.path.dirname(textstat.__file__), 'resources', 'en', 'easy_words.txt')
+    with open(path, encoding='utf-8') as file:
+        return frozenset(line.strip() for line in file)
+
+
+@lru_cache(maxsize=2 ** 16)
+def syllables(word: str) -> int:
+    """Returns the number of syllables in a lowercase word without punctuation."""
+    return len(_pyphen.positions(word)) + 1
+
+
+def count(text: str) -> TextCounts:
+    """Counts what the readability scores of `text` are computed from."""
+    stripped = punctuation.sub('', text)
+    words = len(stripped.split())
+
+    sentences = sentence_separator.split(text)
+    short_sentences = sum(1 for sentence in sentences if len(punctuation.sub('', sentence).split()) <= 2)
+
+    lowered = stripped.lower()
+    syllable_count = sum(syllables(word) for word in lowered.split(' ')) if lowered else 0
+
+    easy = easy_words()
+    unfamiliar = difficult = 0
+    for word in set(word_pattern.findall(text.lower())):
+        if word in easy:
+            continue
+        unfamiliar += 1
+        bare = punctuation.sub('', word)
+        if bare and syllables(bare) >= FOG_SYLLABLE_THRESHOLD:
+            difficult += 1
+
+    return TextCounts(
+        length=len(text),
+        characters=len(text.replace(' ', '')),
+        words=words,
+        sentences=max(1, len(sentences) - short_sentences),
+        syllables=syllable_count,
+        unfamiliar_words=unfamiliar,
+        difficult_words=difficult,
+    )
+
+
+def scores(counts: TextCounts) -> dict[str, float]:
+    """
+    Returns the readability scores derived from `counts`, keyed by metric (see `metrics.METRICS`).
+    """
+    words, sentences = counts.words, counts.sentences
+    sentence_length = legacy_round(words / sentences, 1)
+    syllables_per_word = legacy_round(counts.syllables / words, 1) if words else 0.0
+
+    if words:
+        fog = legacy_round(0.4 * (sentence_length + counts.difficult_words / words * 100), 2)
+        ari = legacy_round(4.71 * legacy_round(counts.characters / words, 2)
+                           + 0.5 * legacy_round(words / sentences, 2) - 21.43, 1)
+        per_unfamiliar_words = 100 - (words - counts.unfamiliar_words) / words * 100
+        dale_chall = 0.1579 * per_unfamiliar_words + 0.0496 * sentence_length
+        if per_unfamiliar_words > 5:
+            dale_chall += 3.6365
+        dale_chall = legacy_round(dale_chall, 2)
+    else:
+        fog = ari = dale_chall = 0.0
+
+    return {
+        'len': counts.length,
+        'flesch_reading_ease': legacy_round(206.835 - 1.015 * sentence_length - 84.6 * syllables_per_word, 2),
+        'gunning_fog': fog,
+        'ari': ari,
+        'dale-chall': dale_chall,
+        'sentence_count': sentences,
+        'lexicon_count': words,
+    }
+
+
+def score_text(text: str) -> dict[str, float]:
+    """Returns every readability score of a cleaned text, keyed by metric (see `metrics.METRICS`)."""
+    return scores(count(text))
+
+
+def textstat_scores(text: str) -> dict[str, float]:
+    """Returns the same scores as `score_text`, computed by `textstat`. Much slower."""
+    from textstat import textstat
+    return {
+        'len': len(text),
+        'flesch_reading_ease': textstat.flesch_reading_ease(text),
+        'gunning_fog': textstat.gunning_fog(text),
+        'ari': textstat.automated_readability_index(text),
+        'dale-chall': textstat.dale_chall_readability_score(text),
+        'sentence_count': textstat.sentence_count(text),
+        'lexicon_count': textstat.lexicon_count(text),
+    }
+
+
+def verify(texts) -> list[tuple[str, str, float, float]]:
+    """
+    Compares `score_text` with `textstat` on every text in `texts`.
+    :return: A list of (text, metric, score, textstat score) for every score which differs.
+    """
+    mismatches = []
+    for text in texts:
+        expected = textstat_scores(text)
+        for metric, value in score_text(text).items():
+            if abs(value - expected[metric]) > 1e-9:
+                mismatches.append((text, metric, value, expected[metric]))
+    return mismatches
+
+
+if __name__ == '__main__':
+    import time
+
+    from dataset import load_dataset
+
+    dataset = load_dataset(columns=['previous', 'current'])
+    corpus = dataset['previous'].tolist() + dataset['current'].tolist()
+
+    start = time.perf_counter()
+    for section in corpus:
+        textstat_scores(section)
+    textstat_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for section in corpus:
+        score_text(section)
+    engine_time = time.perf_counter() - start
+
+    differences = verify(corpus)
+    for section, metric, value, expected in differences:
+        print(f'{metric}: {value} != {expected} for "{section[:60]}..."')
+    print(f'{len(corpus)} texts, {len(differences)} differences from textstat.')
+    print(f'textstat: {textstat_time:.3f}s, single pass: {engine_time:.3f}s ({textstat_time / engine_time:.1f}x)')
@@ -0,0 +1,228 @@
+"""
+Incremental rescoring of the dataset.
+
+The score store (`data_store/scores.sqlite`) records, for the previous and current version of every section, a hash
+of its cleaned text and the versions of the cleaner (`ipynb.helpers.CLEANER_VERSION`) and of the scores
+(`readability.METRICS_VERSION`) which produced the row in `data.csv.gz`. Scores are kept by hash of the cleaned text,
+so a text is scored at most once per version of the scores. Sections added by `ingest.py` also keep their source
+text, so they can be cleaned again when the rules of `clean_text` change.
+
+A rebuild only recomputes the rows whose text or versions changed, and rewrites `data.csv.gz` only if a row did:
+
+    python rescore.py
+    python rescore.py sections.jsonl
+
+Sections given as in `ingest.py` replace the source text of the sections already in the dataset.
+
+The store does not know how the rows written before it existed were produced, so a rebuild records those rows as
+they are, and keeps their published scores even when `METRICS_VERSION` changes; only their text changing makes them
+scored again. Pass `--rescore` to score them again anyway. This changes published numbers: the Dale-Chall scores of
+the original dataset, among others, were computed with another version of `textstat`.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import NamedTuple
+
+import pandas as pd
+
+from dataset import DATA_PATH
+from ipynb.helpers import CLEANER_VERSION, clean_text
+from readability import METRICS_VERSION, score_text
+from store import META_FILE, STORE_PATH
+
+SCORES_FILE = "scores.sqlite"
+
+VERSIONS = ("previous", "current")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (hash TEXT PRIMARY KEY, text TEXT);
+CREATE TABLE IF NOT EXISTS scores (hash TEXT, metrics_version INTEGER, scores TEXT, PRIMARY KEY (hash, metrics_version));
+CREATE TABLE IF NOT EXISTS sections (
+    section TEXT, version TEXT, source_hash TEXT, cleaner_version INTEGER, text_hash TEXT, metrics_version INTEGER,
+    PRIMARY KEY (section, version)
+);
+"""
+
+
+class SectionRecord(NamedTuple):
+    # The source text is unknown for rows which were not added by `ingest.py`.
+    source_hash: str | None
+    cleaner_version: int | None
+    text_hash: str
+    # None for rows recorded as they were published, whose scores are kept until they are rescored explicitly.
+    metrics_version: int | None
+
+
+def text_hash(text: str) -> str:
+    """Returns the hash identifying `text`."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ScoreStore:
+    """Scores by hash of the cleaned text, and how every row of the dataset was produced."""
+
+    def __init__(self, path: str = os.path.join(STORE_PATH, SCORES_FILE)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+    def records(self) -> dict[tuple[str, str], SectionRecord]:
+        """Returns the record of every section, keyed by (section, version)."""
+        rows = self._connection.execute("SELECT section, version, source_hash, cleaner_version, text_hash, "
+                                        "metrics_version FROM sections")
+        return {(section, version): SectionRecord(*record) for section, version, *record in rows}
+
+    def record(self, section: str, version: str, record: SectionRecord):
+        self._connection.execute("INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?, ?)",
+                                 (section, version, *record))
+
+    def source(self, source_hash: str) -> str:
+        return self._connection.execute("SELECT text FROM sources WHERE hash = ?", (source_hash,)).fetchone()[0]
+
+    def set_source(self, section: str, version: str, source: str, record: SectionRecord | None = None) -> bool:
+        """
+        Keeps `source` as the source text of a section.
+        :param record: The current record of the section, if any.
+        :return: True if the source text changed, in which case the section will be cleaned again.
+        """
+        source_hash = text_hash(source)
+        if record is not None and record.source_hash == source_hash:
+            return False
+        self._connection.execute("INSERT OR IGNORE INTO sources VALUES (?, ?)", (source_hash, source))
+        text = record.text_hash if record else ""
+        self.record(section, version, SectionRecord(source_hash, None, text, record.metrics_version if record else 0))
+        return True
+
+    def scores(self, cleaned_hash: str) -> dict | None:
+        """Returns the scores of the text with hash `cleaned_hash` for the current version of the scores, if stored."""
+        row = self._connection.execute("SELECT scores FROM scores WHERE hash = ? AND metrics_version = ?",
+                                       (cleaned_hash, METRICS_VERSION)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_scores(self, cleaned_hash: str, scores: dict):
+        self._connection.execute("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                                 (cleaned_hash, METRICS_VERSION, json.dumps(scores)))
+
+    def score(self, cleaned_text: str) -> dict:
+        """Returns the scores of `cleaned_text`, computing them only if they are not stored."""
+        cleaned_hash = text_hash(cleaned_text)
+        scores = self.scores(cleaned_hash)
+        if scores is None:
+            scores = score_text(cleaned_text)
+            self.add_scores(cleaned_hash, scores)
+        return scores
+
+    def add_row(self, section: str, version: str, source: str, cleaned_text: str, scores: dict):
+        """Records a row scored from `source` with the current versions, such as a row appended by `ingest.py`."""
+        source_hash, cleaned_hash = text_hash(source), text_hash(cleaned_text)
+        self._connection.execute("INSERT OR IGNORE INTO sources VALUES (?, ?)", (source_hash, source))
+        self.add_scores(cleaned_hash, scores)
+        self.record(section, version, SectionRecord(source_hash, CLEANER_VERSION, cleaned_hash, METRICS_VERSION))
+
+
+def update_sources(records, store: ScoreStore) -> int:
+    """
+    Replaces the source text of sections with the sections in `records`, as read by `ingest.read_records`.
+    :return: The number of texts which changed.
+    """
+    from ingest import section_key
+
+    existing = store.records()
+    changed = 0
+    for record in records:
+        key = section_key(record)
+        for version in VERSIONS:
+            if record.get(version):
+                changed += store.set_source(key, version, record[version], existing.get((key, version)))
+    return changed
+
+
+def rebuild(path: str = DATA_PATH, store: ScoreStore | None = None, rescore: bool = False) -> int:
+    """
+    Recomputes the rows of the dataset at `path` whose text, cleaner or scores changed since they were recorded.
+    :param path: Path to the dataset.
+    :param store: The score store. Defaults to the one in `data_store`.
+    :param rescore: Score the rows which are not in the store again, instead of recording them as they are.
+    :return: The number of rows which changed. The dataset is only rewritten if it is not 0.
+    """
+    if store is None:
+        with ScoreStore() as store:
+            return rebuild(path, store, rescore)
+
+    frame = pd.read_csv(path, index_col=0)
+    records = store.records()
+    changed_rows = set()
+    for version in VERSIONS:
+        texts = frame[version].fillna("").tolist()
+        for position, key in enumerate(frame.index):
+            record = records.get((key, version))
+            text = texts[position]
+            if record is not None and record.source_hash and record.cleaner_version != CLEANER_VERSION:
+                text = clean_text(store.source(record.source_hash))
+            cleaned_hash = text_hash(text)
+            published = record is not None and record.metrics_version is None and not rescore
+            if record is not None and record.text_hash == cleaned_hash \
+                    and (record.metrics_version == METRICS_VERSION or published) \
+                    and (record.source_hash is None or record.cleaner_version == CLEANER_VERSION):
+                continue
+
+            source_hash = record.source_hash if record else None
+            cleaner_version = CLEANER_VERSION if source_hash else None
+            if record is None and not rescore:
+                store.record(key, version, SectionRecord(None, None, cleaned_hash, None))
+                continue
+
+            scores = {"": text, **{f"_{metric}": score for metric, score in store.score(text).items()}}
+            for suffix, value in scores.items():
+                column = f"{version}{suffix}"
+                if column in frame.columns and frame[column].iat[position] != value:
+                    frame.iloc[position, frame.columns.get_loc(column)] = value
+                    changed_rows.add(position)
+            store.record(key, version, SectionRecord(source_hash, cleaner_version, cleaned_hash, METRICS_VERSION))
+
+    if changed_rows:
+        temporary = f"{path}.tmp"
+        frame.to_csv(temporary, compression="gzip")
+        os.replace(temporary, path)
+    return len(changed_rows)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rescore the sections of the PLUS Explorer dataset which changed.")
+    parser.add_argument("sources", nargs="*", help="JSONL files or directories of .json files with new source texts.")
+    parser.add_argument("--data", default=DATA_PATH, help="Path to the dataset.")
+    parser.add_argument("--rescore", action="store_true",
+                        help="Score the rows which are not in the score store again, instead of recording them as "
+                             "they are. This changes the published scores of the original dataset.")
+    arguments = parser.parse_args()
+
+    with ScoreStore() as score_store:
+        if arguments.sources:
+            from ingest import read_records
+
+            for source in arguments.sources:
+                print(f"{update_sources(read_records(source), score_store)} texts changed in {source}")
+        rows = rebuild(arguments.data, score_store, arguments.rescore)
+    print(f"{rows} rows changed")
+
+    if rows and arguments.data == DATA_PATH and os.path.exists(os.path.join(STORE_PATH, META_FILE)):
+        from store import build_store
+
+        print(f"Store written to {build_store()}")
@@ -0,0 +1,137 @@
+"""
+Index of the sections in the dataset.
+
+The Section Explorer renders one section at a time, and its selector should not have to send every key of the
+dataset to the browser. `SectionIndex` keeps the links and scores of every section in arrays, with a hash map from
+section key to row, so everything shown for a section is fetched at once with `get`. It also keeps an inverted index
+from the words of every key (the name of the Act and the section number) to the sections whose key contains them,
+which `search` uses to return only the keys matching what has been typed so far.
+"""
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from typing import NamedTuple
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_PATH, load_dataset, memoize
+from metrics import METRICS
+
+word_pattern = re.compile(r"\w+")
+
+LINK_COLUMNS = ("act_name", "previous_link", "current_link")
+
+EXPLORER_URL = "https://share.streamlit.io/houfu/plus-explorer/main/explorer.py"
+
+
+def explorer_url(key: str, from_date: str | None = None, to_date: str | None = None) -> str:
+    """Returns the link to the Section Explorer page of the section `key`, comparing two dates if they are given."""
+    params = {"section": key}
+    if from_date and to_date:
+        params.update({"from": from_date, "to": to_date})
+    return f"{EXPLORER_URL}?" + urlencode(params)
+
+
+class Section(NamedTuple):
+    key: str
+    act_name: str
+    previous_link: str
+    current_link: str
+    # Scores in the order of `metrics.METRICS`.
+    previous_scores: tuple[float, ...]
+    current_scores: tuple[float, ...]
+
+    def previous(self, metric_key: str) -> float:
+        return self.previous_scores[_metric_positions[metric_key]]
+
+    def current(self, metric_key: str) -> float:
+        return self.current_scores[_metric_positions[metric_key]]
+
+    def delta(self, metric_key: str) -> float:
+        return self.current(metric_key) - self.previous(metric_key)
+
+
+_metric_positions = {key: position for position, key in enumerate(METRICS)}
+
+
+def key_words(key: str) -> list[str]:
+    """Returns the words of a section key, or of a search query, in lowercase."""
+    return word_pattern.findall(key.lower())
+
+
+class SectionIndex:
+    """Lookup of sections by key, and search of keys by the words they contain."""
+
+    def __init__(self, frame: pd.DataFrame):
+        """
+        :param frame: The dataset, with the columns in `LINK_COLUMNS` and the previous and current score of every
+            metric. If a key is repeated, its first row is used.
+        """
+        self._keys = frame.index.astype(str).tolist()
+        self._positions: dict[str, int] = {}
+        for position, key in enumerate(self._keys):
+            self._positions.setdefault(key, position)
+        self._links = {column: frame[column].astype(str).tolist() for column in LINK_COLUMNS}
+        self._previous = frame[[metric.previous_column for metric in METRICS.values()]].to_numpy(dtype=float)
+        self._current = frame[[metric.current_column for metric in METRICS.values()]].to_numpy(dtype=float)
+
+        postings: dict[str, list[int]] = {}
+        for key, position in self._positions.items():
+            for word in dict.fromkeys(key_words(key)):
+                postings.setdefault(word, []).append(position)
+        self._words = sorted(postings)
+        self._postings = [np.array(postings[word], dtype=np.int32) for word in self._words]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    def keys(self) -> list[str]:
+        return self._keys
+
+    def get(self, key: str) -> Section:
+        """Returns the section `key`. Raises KeyError if it is not in the dataset."""
+        position = self._positions[key]
+        return Section(key, *(self._links[column][position] for column in LINK_COLUMNS),
+                       tuple(self._previous[position].tolist()), tuple(self._current[position].tolist()))
+
+    def _matching(self, word: str, prefix: bool) -> np.ndarray:
+        start = bisect_left(self._words, word)
+        if not prefix:
+            if start < len(self._words) and self._words[start] == word:
+                return self._postings[start]
+            return np.zeros(0, dtype=np.int32)
+        stop = bisect_left(self._words, word + "\uffff", start)
+        if stop - start == 1:
+            return self._postings[start]
+        return np.unique(np.concatenate(self._postings[start:stop] or [np.zeros(0, dtype=np.int32)]))
+
+    def search(self, query: str, limit: int = 50) -> list[str]:
+        """
+        Returns the keys of the sections containing every word of `query`, in the order of the dataset.
+        The last word of the query may be incomplete, so it matches every word it is a prefix of.
+        :param query: Words typed by the user, such as "penal code 30". An empty query matches every section.
+        :param limit: Maximum number of keys to return.
+        """
+        words = key_words(query)
+        if not words:
+            return self._keys[:limit]
+        matches = None
+        for position, word in enumerate(words):
+            found = self._matching(word, prefix=position == len(words) - 1 and not query[-1:].isspace())
+            matches = found if matches is None else np.intersect1d(matches, found, assume_unique=True)
+            if not len(matches):
+                return []
+        return [self._keys[position] for position in matches[:limit].tolist()]
+
+
+def section_index(path: str = DATA_PATH) -> SectionIndex:
+    """Returns the index of the dataset at `path`, built once per version of the dataset."""
+    columns = list(LINK_COLUMNS) + [column for metric in METRICS.values()
+                                    for column in (metric.previous_column, metric.current_column)]
+    return memoize("section_index", lambda: SectionIndex(load_dataset(path, columns)), path)
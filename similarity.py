@@ -0,0 +1,260 @@
+"""
+Near-duplicate clauses across sections.
+
+Statutes repeat the same wording in many sections, such as "shall be liable on conviction to a fine not exceeding".
+This module splits the previous and current text of every section into clauses, and finds the clauses which are
+near-identical to each other without comparing every pair of clauses:
+
+* every clause is reduced to the set of its shingles, the runs of `SHINGLE_TOKENS` tokens of `tokenize_text`;
+* a MinHash signature of `NUM_HASHES` values estimates how much the shingles of two clauses overlap; and
+* the signatures are cut into `BANDS` bands. Clauses with an identical band are candidates, and candidates whose
+  signatures agree on at least `THRESHOLD` of their values are near-duplicates.
+
+Near-duplicates are grouped into clusters, separately for the previous and the current text. A cluster of previous
+clauses was rewritten consistently if its clauses became clauses of a single cluster of the current text.
+
+Clusters found in more than `BOILERPLATE_SECTIONS` sections are boilerplate. The other clusters relate sections
+sharing a clause, and the most related sections of every section are kept, so the Section Explorer looks them up
+with `similar`.
+
+    python similarity.py [--data data.csv.gz]
+"""
+from __future__ import annotations
+
+import re
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_PATH, load_dataset, memoize
+from ipynb.helpers import tokenizer
+
+SHINGLE_TOKENS = 3
+NUM_HASHES = 128
+BANDS = 32
+# Share of equal signature values above which two clauses are near-duplicates.
+THRESHOLD = 0.5
+# Clauses of fewer tokens are not indexed.
+MIN_CLAUSE_TOKENS = 8
+BOILERPLATE_SECTIONS = 20
+# Number of similar sections kept for every section.
+SIMILAR_LIMIT = 10
+
+VERSIONS = ("previous", "current")
+
+# The end of a sentence, as `alignment.sentence_end` finds it, or of a clause ending with ";" or ":".
+clause_end = re.compile(r"[.?!]['\")\]]*\s+(?=[A-Z])|[;:]\s+")
+
+# A prime above every shingle hash, and the coefficients of the hash functions (a * x + b) % _PRIME of the signatures.
+_PRIME = np.uint64((1 << 31) - 1)
+_coefficients = np.random.default_rng(0).integers(1, (1 << 31) - 1, size=(2, NUM_HASHES, 1), dtype=np.uint64)
+
+
+def clauses(text: str) -> list[list[str]]:
+    """
+    Splits `text` into clauses at the end of every sentence and after every ";" or ":", and returns the tokens of
+    every clause. Abbreviations such as "Cap." and "No." do not end a sentence, as they are not followed by a capital.
+    """
+    ends = {match.end() for match in clause_end.finditer(text)}
+    found, clause = [], []
+    for match in tokenizer.finditer(text):
+        clause.append(match.group())
+        if match.end() in ends:
+            found.append(clause)
+            clause = []
+    if clause:
+        found.append(clause)
+    return found
+
+
+def clause_text(tokens: list[str]) -> str:
+    return "".join(tokens).strip()
+
+
+def shingles(tokens: list[str]) -> np.ndarray:
+    """Returns the hashes of the shingles of a clause."""
+    words = [token.strip().lower() for token in tokens]
+    runs = [" ".join(words[start:start + SHINGLE_TOKENS])
+            for start in range(max(1, len(words) - SHINGLE_TOKENS + 1))]
+    return np.array([zlib.crc32(run.encode("utf-8")) for run in runs], dtype=np.uint64)
+
+
+def signatures(hashes: list[np.ndarray], batch_size: int = 20_000) -> np.ndarray:
+    """
+    Returns the MinHash signature of every set of shingle hashes, one row of `NUM_HASHES` values per set.
+    The sets are hashed in batches of about `batch_size` shingles.
+    """
+    result = np.zeros((len(hashes), NUM_HASHES), dtype=np.uint32)
+    start = 0
+    while start < len(hashes):
+        stop, size = start, 0
+        while stop < len(hashes) and (size == 0 or size + len(hashes[stop]) <= batch_size):
+            size += len(hashes[stop])
+            stop += 1
+        values = np.concatenate(hashes[start:stop]) % _PRIME
+        hashed = (_coefficients[0] * values + _coefficients[1]) % _PRIME
+        offsets = np.cumsum([0] + [len(value) for value in hashes[start:stop - 1]])
+        result[start:stop] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        start = stop
+    return result
+
+
+def _find(parents: np.ndarray, item: int) -> int:
+    while parents[item] != item:
+        parents[item] = parents[parents[item]]
+        item = parents[item]
+    return item
+
+
+def cluster(signature: np.ndarray, bands: int = BANDS, threshold: float = THRESHOLD) -> np.ndarray:
+    """
+    Groups near-duplicate rows of `signature`.
+    Within every band, rows with an identical band are compared with the first of them only, so the work grows with
+    the number of rows, however many rows share a band.
+    :return: The cluster of every row, numbered by its first row.
+    """
+    parents = np.arange(len(signature))
+    if not len(signature):
+        return parents
+    width = signature.shape[1] // bands
+    for band in range(bands):
+        keys = np.ascontiguousarray(signature[:, band * width:(band + 1) * width]) \
+            .view(np.dtype((np.void, width * signature.itemsize))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        representatives = first[inverse.ravel()]
+        candidates = np.flatnonzero(representatives != np.arange(len(signature)))
+        agreement = (signature[candidates] == signature[representatives[candidates]]).mean(axis=1)
+        for row, representative in zip(candidates[agreement >= threshold].tolist(),
+                                       representatives[candidates[agreement >= threshold]].tolist()):
+            root, other = _find(parents, row), _find(parents, representative)
+            if root != other:
+                parents[max(root, other)] = min(root, other)
+    return np.array([_find(parents, row) for row in range(len(parents))])
+
+
+class SimilarityIndex:
+    """Clusters of near-identical clauses, and the sections sharing them."""
+
+    def __init__(self, frame: pd.DataFrame):
+        """
+        :param frame: The dataset, with the `previous` and `current` text of every section. If a key is repeated,
+            its first row is used.
+        """
+        frame = frame[~frame.index.duplicated()]
+        self.keys = frame.index.astype(str).tolist()
+        rows, versions, texts, hashes = [], [], [], []
+        for version in VERSIONS:
+            for row, text in enumerate(frame[version].fillna("")):
+                for tokens in clauses(text):
+                    if len(tokens) >= MIN_CLAUSE_TOKENS:
+                        rows.append(row)
+                        versions.append(version)
+                        texts.append(clause_text(tokens))
+                        hashes.append(shingles(tokens))
+        self.clauses = pd.DataFrame({"row": np.array(rows, dtype=np.int32), "version": versions, "text": texts})
+        self.signature = signatures(hashes)
+
+        self.clauses["cluster"] = -1
+        for version in VERSIONS:
+            positions = np.flatnonzero(self.clauses["version"].to_numpy() == version)
+            self.clauses.loc[positions, "cluster"] = positions[cluster(self.signature[positions])]
+        self._similar = self._similar_sections()
+
+    def _similar_sections(self) -> dict[str, list[tuple[str, int]]]:
+        rewritten = self.rewrites()
+        shared = defaultdict(Counter)
+        for version in VERSIONS:
+            for _, clauses in self.clauses[self.clauses["version"] == version].groupby("cluster"):
+                members = np.unique(clauses["row"].to_numpy()).tolist()
+                if not 1 < len(members) <= BOILERPLATE_SECTIONS:
+                    continue
+                if version == "previous":
+                    # The current clusters which the clauses of every section became. A clause shared before and
+                    # after the revision is only counted once, in the current text.
+                    became = {row: set(rewritten[positions].tolist()) - {-1}
+                              for row, positions in clauses.groupby("row").groups.items()}
+                for row in members:
+                    for other in members:
+                        if other != row and (version == "current" or not became[row] & became[other]):
+                            shared[row][other] += 1
+        return {self.keys[row]: [(self.keys[other], count) for other, count in counts.most_common(SIMILAR_LIMIT)]
+                for row, counts in shared.items()}
+
+    def similar(self, key: str) -> list[tuple[str, int]]:
+        """
+        Returns the sections sharing the most near-identical clauses with the section `key`, excluding boilerplate,
+        with the number of distinct clauses they share in the previous or the current text.
+        """
+        return self._similar.get(key, [])
+
+    def rewrites(self) -> pd.Series:
+        """
+        Returns the cluster of the current text which every clause of the previous text became, indexed like
+        `clauses`. A previous clause became the current clause of its section whose signature agrees the most with
+        its own, if they agree on at least `THRESHOLD` of their values. Otherwise it is -1.
+        """
+        previous = self.clauses.index[self.clauses["version"] == "previous"]
+        current = self.clauses[self.clauses["version"] == "current"]
+        by_row = {row: positions.to_numpy() for row, positions in current.groupby("row").groups.items()}
+        rewritten = pd.Series(-1, index=previous)
+        for position, row in zip(previous, self.clauses.loc[previous, "row"]):
+            candidates = by_row.get(row)
+            if candidates is None:
+                continue
+            agreement = (self.signature[candidates] == self.signature[position]).mean(axis=1)
+            if agreement.max() >= THRESHOLD:
+                rewritten[position] = self.clauses.at[candidates[agreement.argmax()], "cluster"]
+        return rewritten
+
+    def clusters(self, version: str = "previous", min_sections: int = 2) -> pd.DataFrame:
+        """
+        Returns the clusters of near-identical clauses of `version` found in at least `min_sections` sections.
+        :return: One row per cluster with an `example` clause, the number of `clauses` and of `sections`, and whether
+            it is `boilerplate`, ordered by number of sections. Clusters of the previous text also have the number of
+            clauses `unchanged`, the number of distinct clusters they were `rewritten_to` in the current text, and
+            whether they were rewritten `consistently`, that is to a single cluster.
+        """
+        clauses = self.clauses[self.clauses["version"] == version]
+        grouped = clauses.groupby("cluster")
+        table = pd.DataFrame({"example": grouped["text"].first(), "clauses": grouped.size(),
+                              "sections": grouped["row"].nunique()})
+        table = table[table["sections"] >= min_sections]
+        table["boilerplate"] = table["sections"] > BOILERPLATE_SECTIONS
+        if version == "previous":
+            rewritten = self.rewrites()
+            clauses = clauses.assign(rewritten=rewritten)
+            current_texts = set(zip(self.clauses.loc[self.clauses["version"] == "current", "row"],
+                                    self.clauses.loc[self.clauses["version"] == "current", "text"]))
+            clauses = clauses.assign(unchanged=[(row, text) in current_texts
+                                                for row, text in zip(clauses["row"], clauses["text"])])
+            grouped = clauses[clauses["cluster"].isin(table.index)].groupby("cluster")
+            table["unchanged"] = grouped["unchanged"].sum()
+            table["rewritten_to"] = grouped["rewritten"].agg(lambda values: values[values >= 0].nunique())
+            table["consistently"] = table["rewritten_to"] == 1
+        return table.sort_values(["sections", "clauses"], ascending=False, kind="stable")
+
+
+def similarity_index(path: str = DATA_PATH) -> SimilarityIndex:
+    """Returns the similarity index of the dataset at `path`, built once per version of the dataset."""
+    return memoize("similarity_index", lambda: SimilarityIndex(load_dataset(path, list(VERSIONS))), path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Find near-identical clauses in the PLUS Explorer dataset.")
+    parser.add_argument("--data", default=DATA_PATH, help="Path to the dataset.")
+    parser.add_argument("--top", type=int, default=20, help="Number of clusters to show.")
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+    index = SimilarityIndex(load_dataset(arguments.data, list(VERSIONS)))
+    print(f"{len(index.clauses.index)} clauses indexed in {time.perf_counter() - start:.1f}s")
+    found = index.clusters()
+    print(f"{len(found.index)} clusters of previous clauses in more than one section, "
+          f"{int(found['consistently'].sum())} rewritten consistently, {int(found['boilerplate'].sum())} boilerplate")
+    with pd.option_context("display.max_colwidth", 80, "display.width", 200):
+        print(found.head(arguments.top).to_string())
@@ -0,0 +1,193 @@
+"""
+Columnar on-disk store for the PLUS Explorer dataset.
+
+`data.csv.gz` has to be decompressed and parsed in full before anything can be read from it.
+The store keeps every column of the dataset in its own file instead:
+
+* numeric columns as NumPy arrays (`<column>.npy`), which are memory-mapped on load; and
+* string columns as a UTF-8 blob (`<column>.txt`) with the byte offset of every row (`<column>.offsets.npy`),
+  so the text of a single section can be read without reading the rest.
+
+The full-text index of the text columns is written along with the store (see `textindex.py`).
+
+`meta.json` records the index, the order and kind of every column and the version of the CSV it was built from.
+It is written last, so a store without it is incomplete.
+
+Build the store after changing `data.csv.gz`:
+
+    python store.py [data.csv.gz] [data_store]
+
+Pass `--diffs` to also precompute the redline diff of every section (see `diffs.py`), and `--sentences` to align and
+score the sentences of every section (see `alignment.py`), which needs the `notebook` extras.
+"""
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_PATH, dataset_version
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_store")
+
+META_FILE = "meta.json"
+
+# Columns which hold the full text of a section. Readers should fetch these one section at a time.
+TEXT_COLUMNS = ("previous", "current")
+
+
+def _column_file(store_path: str, column: str, suffix: str) -> str:
+    return os.path.join(store_path, f"{column}{suffix}")
+
+
+def _write_strings(store_path: str, column: str, values):
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    with open(_column_file(store_path, column, ".txt"), "wb") as blob:
+        for position, value in enumerate(values):
+            encoded = ("" if pd.isna(value) else str(value)).encode("utf-8")
+            blob.write(encoded)
+            offsets[position + 1] = offsets[position] + len(encoded)
+    np.save(_column_file(store_path, column, ".offsets.npy"), offsets)
+
+
+def build_store(csv_path: str = DATA_PATH, store_path: str = STORE_PATH) -> str:
+    """
+    Converts the CSV dataset at `csv_path` into a columnar store at `store_path`.
+    :param csv_path: Path to the dataset in GZIP CSV format.
+    :param store_path: Directory to write the store to. It is created if it does not exist.
+    :return: The path to the store.
+    """
+    frame = pd.read_csv(csv_path, index_col=0)
+    os.makedirs(store_path, exist_ok=True)
+    meta_path = os.path.join(store_path, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    columns = {}
+    for column in frame.columns:
+        if pd.api.types.is_numeric_dtype(frame[column]):
+            np.save(_column_file(store_path, column, ".npy"), frame[column].to_numpy())
+            columns[column] = "numeric"
+        else:
+            _write_strings(store_path, column, frame[column].tolist())
+            columns[column] = "string"
+
+    from textindex import write_text_index
+    write_text_index(frame, store_path)
+
+    meta = {
+        "source_version": list(dataset_version(csv_path)),
+        "rows": len(frame.index),
+        "index_name": frame.index.name,
+        "index": frame.index.tolist(),
+        "columns": columns,
+    }
+    with open(meta_path, "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+    return store_path
+
+
+class ColumnStore:
+    """Read access to a store written by `build_store`."""
+
+    def __init__(self, store_path: str = STORE_PATH):
+        self.path = store_path
+        with open(os.path.join(store_path, META_FILE), encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.index = pd.Index(self.meta["index"], name=self.meta["index_name"])
+        self._positions: dict[str, int] = {}
+        for position, key in enumerate(self.meta["index"]):
+            self._positions.setdefault(key, position)
+        self._blobs: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self.meta["columns"])
+
+    def is_current(self, csv_path: str = DATA_PATH) -> bool:
+        """Returns True if the store was built from the current version of the CSV at `csv_path`."""
+        return os.path.exists(csv_path) and tuple(self.meta["source_version"]) == dataset_version(csv_path)
+
+    def position(self, key: str) -> int:
+        """Returns the row number of the section `key`. If the key is repeated, the first row is returned."""
+        return self._positions[key]
+
+    def numeric(self, column: str) -> np.ndarray:
+        """Returns the read-only, memory-mapped values of a numeric column."""
+        return np.load(_column_file(self.path, column, ".npy"), mmap_mode="r")
+
+    def _blob(self, column: str) -> tuple[np.ndarray, np.ndarray]:
+        if column not in self._blobs:
+            offsets = np.load(_column_file(self.path, column, ".offsets.npy"), mmap_mode="r")
+            if offsets[-1]:
+                blob = np.memmap(_column_file(self.path, column, ".txt"), dtype=np.uint8, mode="r")
+            else:
+                blob = np.zeros(0, dtype=np.uint8)
+            self._blobs[column] = (offsets, blob)
+        return self._blobs[column]
+
+    def string(self, column: str, position: int) -> str:
+        """Returns the value of a string column at row `position`, reading only that value from disk."""
+        offsets, blob = self._blob(column)
+        return bytes(blob[offsets[position]:offsets[position + 1]]).decode("utf-8")
+
+    def strings(self, column: str) -> list[str]:
+        """Returns every value of a string column."""
+        offsets, blob = self._blob(column)
+        data = bytes(blob)
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def text(self, column: str, key: str) -> str:
+        """Returns the value of a string column for the section `key`."""
+        return self.string(column, self.position(key))
+
+    def frame(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """
+        Returns the requested columns as a DataFrame indexed by section.
+        :param columns: Columns to load. Defaults to every column.
+        """
+        if columns is None:
+            columns = self.columns
+        data = {}
+        for column in columns:
+            if self.meta["columns"][column] == "numeric":
+                data[column] = self.numeric(column)
+            else:
+                data[column] = self.strings(column)
+        return pd.DataFrame(data, index=self.index, columns=columns)
+
+
+def open_store(csv_path: str = DATA_PATH, store_path: str = STORE_PATH) -> ColumnStore | None:
+    """Returns the store at `store_path` if it exists and is up to date with `csv_path`, otherwise None."""
+    if not os.path.exists(os.path.join(store_path, META_FILE)):
+        return None
+    store = ColumnStore(store_path)
+    return store if store.is_current(csv_path) else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the PLUS Explorer dataset into a columnar store.")
+    parser.add_argument("csv_path", nargs="?", default=DATA_PATH)
+    parser.add_argument("store_path", nargs="?", default=STORE_PATH)
+    parser.add_argument("--diffs", action="store_true", help="Precompute the redline diff of every section.")
+    parser.add_argument("--sentences", action="store_true",
+                        help="Align and score the sentences of every section. Needs the notebook extras.")
+    arguments = parser.parse_args()
+    print(f"Store written to {build_store(arguments.csv_path, arguments.store_path)}")
+
+    if arguments.diffs:
+        from diffs import DIFFS_FILE, precompute_diffs
+
+        store = ColumnStore(arguments.store_path)
+        computed = precompute_diffs(zip(store.strings("previous"), store.strings("current")),
+                                    os.path.join(arguments.store_path, DIFFS_FILE))
+        print(f"{computed} diffs computed")
+
+    if arguments.sentences:
+        from alignment import write_sentence_table
+
+        print(f"{write_sentence_table(ColumnStore(arguments.store_path))} aligned sentences written")
@@ -0,0 +1,73 @@
+"""
+Checks that `clean_text` cleans every text of the dataset exactly as its original five-pass version did.
+
+The texts of the dataset were cleaned when they were collected, so every text is also checked as raw text would be
+seen: with clause and subclause notations, indented lines, amendment info and line breaks put back. Random strings
+of the characters the rules match are checked too.
+"""
+import random
+import re
+
+import pandas as pd
+import pytest
+
+from dataset import DATA_PATH
+from ipynb.helpers import clean_text
+
+
+def reference_clean_text(text: str) -> str:
+    """The original version of `clean_text`, which applies its rules one after the other."""
+    # Remove subclause notations
+    cleaned_text = re.sub(r'^\(\w*\)\s+', '', text, flags=re.MULTILINE)
+    # Remove clause notation at beginning of clause
+    cleaned_text_1 = re.sub(r'^\d+\w?\.(—\(1\))?\s+', '', cleaned_text)
+    # Remove extra spacing at start of line
+    cleaned_text_2 = re.sub(r'^\s+', '', cleaned_text_1, flags=re.MULTILINE)
+    # Remove amendment info
+    cleaned_text_3 = re.sub(r'\[\w+]$', '', cleaned_text_2, flags=re.MULTILINE)
+    # Remove extra spaces
+    return re.sub(r'[\t\n\r\f\v]', ' ', cleaned_text_3).strip()
+
+
+def raw_text(text: str, row: int) -> str:
+    """Returns `text` with the kinds of notation `clean_text` removes put back, varied by `row`."""
+    sentences = re.split(r'(?<=[.;:])\s+', text)
+    lines = []
+    for number, sentence in enumerate(sentences):
+        kind = (row + number) % 5
+        if kind == 0:
+            lines.append(f'({chr(97 + number % 26)})\t{sentence}')
+        elif kind == 1:
+            lines.append(f'   {sentence} [{row}]')
+        elif kind == 2:
+            lines.append(f'({number})\n\n  ({number}A) {sentence}')
+        elif kind == 3:
+            lines.append(f'\r\n{sentence}\f[Amended]')
+        else:
+            lines.append(sentence)
+    clause = (f'{row}.—(1) ', f'{row}A. ', '', f'{row}.\n')[row % 4]
+    return clause + '\n'.join(lines)
+
+
+# Pieces of the random strings checked.
+FRAGMENTS = ['(', ')', 'a', '1', '.', '—', '—(1)', '(a)', '12A.', '[', ']', '[Act5]', ' ', '\n', '\t', '\r', '\f',
+             '\v', '\x85', '\u2028', '\xa0']
+
+
+def random_texts(count: int, seed: int = 0) -> list[str]:
+    """Returns `count` random strings of up to 25 of `FRAGMENTS`."""
+    generator = random.Random(seed)
+    return [''.join(generator.choices(FRAGMENTS, k=generator.randint(0, 25))) for _ in range(count)]
+
+
+def dataset_texts(path: str = DATA_PATH) -> list[str]:
+    """Returns every previous and current text of the dataset, followed by each of them as raw text."""
+    frame = pd.read_csv(path, index_col=0, usecols=['index', 'previous', 'current'])
+    texts = [text for column in ('previous', 'current') for text in frame[column].dropna()]
+    return texts + [raw_text(text, row) for row, text in enumerate(texts)]
+
+
+@pytest.mark.parametrize("texts", [dataset_texts(), random_texts(20_000)], ids=["dataset", "random"])
+def test_clean_text_matches_reference(texts):
+    mismatches = [text for text in texts if clean_text(text) != reference_clean_text(text)]
+    assert not mismatches, f"{len(mismatches)} of {len(texts)} texts cleaned differently: {mismatches[0][:200]!r}"
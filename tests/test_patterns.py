@@ -0,0 +1,31 @@
+"""Checks that the table of patterns stays bounded without losing the patterns found in many chunks."""
+import numpy as np
+
+from patterns import _merge
+
+
+def chunk_table(chunk: int, singletons: int, recurring: bool) -> dict:
+    table = {("insert", "", f"word {chunk}.{number}"): [1, 1, np.zeros(1), f"section {chunk}"]
+             for number in range(singletons)}
+    if recurring:
+        # Found last in the chunk, after the patterns which fill the table.
+        table[("replace", "shall", "must")] = [2, 1, np.ones(1), f"section {chunk}"]
+    return table
+
+
+def test_pattern_found_once_per_chunk_is_counted_in_every_chunk():
+    table, dropped = {}, 0
+    for chunk in range(20):
+        dropped = _merge(table, chunk_table(chunk, 30, recurring=True), 50, dropped)
+        assert len(table) <= 50
+    occurrences, sections, delta, key, _ = table[("replace", "shall", "must")]
+    assert (occurrences, sections, delta.tolist(), key) == (40, 20, [20.0], "section 0")
+
+
+def test_patterns_are_kept_until_the_table_is_full():
+    table, dropped = {}, 0
+    for chunk in range(3):
+        dropped = _merge(table, chunk_table(chunk, 10, recurring=chunk == 1), 50, dropped)
+    assert dropped == 0
+    assert len(table) == 31
+    assert table[("replace", "shall", "must")][1] == 1
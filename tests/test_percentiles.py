@@ -0,0 +1,37 @@
+"""Checks the share of improved sections of `CorpusStatistics` against plain pandas computations."""
+import pandas as pd
+import pytest
+
+from dataset import load_dataset
+from metrics import METRICS, add_deltas
+from percentiles import CorpusStatistics, corpus_statistics
+
+READABILITY_METRICS = [metric for metric in METRICS.values() if metric.delta_color != "off"]
+
+
+def pandas_share_improved(frame: pd.DataFrame, metric) -> float:
+    diff = frame[metric.diff_column].dropna()
+    return float((diff > 0).mean() if metric.delta_color == "normal" else (diff < 0).mean())
+
+
+@pytest.mark.parametrize("metric", READABILITY_METRICS, ids=lambda metric: metric.key)
+def test_share_improved_direction(metric):
+    # Diffs of +1, -1, -2 and 0: one section got a higher score, two a lower one and one is unchanged.
+    frame = pd.DataFrame({column: values for key in METRICS for column, values in (
+        (METRICS[key].previous_column, [10.0, 10.0, 10.0, 10.0]),
+        (METRICS[key].current_column, [11.0, 9.0, 8.0, 10.0]))})
+    frame = add_deltas(frame)
+    expected = 0.25 if metric.delta_color == "normal" else 0.5
+    assert CorpusStatistics(frame).share_improved(metric.key) == pytest.approx(expected)
+    assert pandas_share_improved(frame, metric) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("metric", READABILITY_METRICS, ids=lambda metric: metric.key)
+def test_share_improved_matches_dataset(metric):
+    frame = load_dataset(columns=[metric.previous_column, metric.current_column])
+    assert corpus_statistics().share_improved(metric.key) == pytest.approx(pandas_share_improved(frame, metric))
+
+
+def test_share_improved_rejects_other_metrics():
+    with pytest.raises(ValueError):
+        corpus_statistics().share_improved("lexicon_count")
@@ -0,0 +1,15 @@
+"""Checks the single-pass readability scores against `textstat` on every text of the dataset."""
+import pytest
+
+pytest.importorskip("textstat")
+pytest.importorskip("pyphen")
+
+from dataset import load_dataset  # noqa: E402
+from readability import verify  # noqa: E402
+
+
+def test_scores_match_textstat():
+    dataset = load_dataset(columns=["previous", "current"])
+    texts = dataset["previous"].dropna().tolist() + dataset["current"].dropna().tolist()
+    mismatches = verify(texts)
+    assert not mismatches, f"{len(mismatches)} scores differ from textstat, such as {mismatches[0][1:]}"
@@ -0,0 +1,188 @@
+"""
+Full-text index of the previous and current text of every section.
+
+Searching the text of every section with `str.contains` reads the whole corpus for every query. This index maps
+every word to the sections containing it and the positions of the word in them, so a phrase is found by looking up
+its words and checking that they follow each other, without reading any text.
+
+For every text column, the postings of all words are stored end to end in two arrays, sorted by word, then section,
+then position: the row of the section (`text_<column>.rows.npy`) and the position of the word in its text
+(`text_<column>.positions.npy`). `text_<column>.offsets.npy` gives where the postings of every word start.
+The words are listed in alphabetical order in `text_words.json`. `build_store` writes these files along with the
+store, and they are memory-mapped on load.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from bisect import bisect_left
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_PATH, load_dataset, memoize
+from store import STORE_PATH, TEXT_COLUMNS, open_store
+
+word_pattern = re.compile(r"\w+")
+
+WORDS_FILE = "text_words.json"
+
+# Where a phrase is searched for, and the label of every option in the Section Explorer.
+SEARCH_MODES = {
+    "either": "Previous or current text",
+    "previous": "Previous text",
+    "current": "Current text",
+    "removed": "Previous text but not current text",
+    "added": "Current text but not previous text",
+}
+
+
+class Postings(NamedTuple):
+    rows: np.ndarray
+    positions: np.ndarray
+    # Postings of word i are rows[offsets[i]:offsets[i + 1]] and positions[offsets[i]:offsets[i + 1]].
+    offsets: np.ndarray
+
+
+def words(text: str) -> list[str]:
+    """Returns the words of `text` in lowercase, as they are indexed."""
+    return word_pattern.findall(text.lower())
+
+
+def build_postings(texts: dict[str, list[str]]) -> tuple[list[str], dict[str, Postings]]:
+    """
+    Indexes the words of every text.
+    :param texts: The texts of every column to index, in the order of the rows of the dataset.
+    :return: The words in alphabetical order, and the postings of every column.
+    """
+    ids: dict[str, int] = {}
+    tokens = {}
+    for column, values in texts.items():
+        word_ids, rows, positions = [], [], []
+        for row, text in enumerate(values):
+            found = words(text) if isinstance(text, str) else []
+            word_ids.extend(ids.setdefault(word, len(ids)) for word in found)
+            rows.extend([row] * len(found))
+            positions.extend(range(len(found)))
+        tokens[column] = (np.array(word_ids, dtype=np.int64), np.array(rows, dtype=np.int32),
+                          np.array(positions, dtype=np.int32))
+
+    vocabulary = sorted(ids)
+    order = np.zeros(len(ids), dtype=np.int64)
+    order[[ids[word] for word in vocabulary]] = np.arange(len(vocabulary))
+    postings = {}
+    for column, (word_ids, rows, positions) in tokens.items():
+        word_ids = order[word_ids]
+        sort = np.lexsort((positions, rows, word_ids))
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(word_ids, minlength=len(vocabulary)), out=offsets[1:])
+        postings[column] = Postings(rows[sort], positions[sort], offsets)
+    return vocabulary, postings
+
+
+def _file(store_path: str, column: str, name: str) -> str:
+    return os.path.join(store_path, f"text_{column}.{name}.npy")
+
+
+def write_text_index(frame: pd.DataFrame, store_path: str):
+    """Indexes the text columns of `frame` and writes the index to `store_path`."""
+    vocabulary, postings = build_postings({column: frame[column].tolist() for column in TEXT_COLUMNS})
+    for column, column_postings in postings.items():
+        for name, values in column_postings._asdict().items():
+            np.save(_file(store_path, column, name), values)
+    with open(os.path.join(store_path, WORDS_FILE), "w", encoding="utf-8") as file:
+        json.dump(vocabulary, file)
+
+
+class TextIndex:
+    """Phrase search over the text columns of the dataset."""
+
+    def __init__(self, keys: list[str], vocabulary: list[str], postings: dict[str, Postings]):
+        self.keys = keys
+        self._vocabulary = vocabulary
+        self._postings = postings
+        # Rows and positions are combined into a single sortable number, so matches can be found with `np.isin`.
+        self._stride = 1 + max((int(column.positions.max()) for column in postings.values()
+                                if len(column.positions)), default=0)
+
+    @classmethod
+    def open(cls, store) -> TextIndex | None:
+        """Opens the index written with the `ColumnStore` `store`, or returns None if there is none."""
+        path = os.path.join(store.path, WORDS_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as file:
+            vocabulary = json.load(file)
+        postings = {column: Postings(*(np.load(_file(store.path, column, name), mmap_mode="r")
+                                       for name in Postings._fields)) for column in TEXT_COLUMNS}
+        return cls(store.index.astype(str).tolist(), vocabulary, postings)
+
+    def _occurrences(self, column: str, word: str) -> np.ndarray:
+        word_id = bisect_left(self._vocabulary, word)
+        if word_id == len(self._vocabulary) or self._vocabulary[word_id] != word:
+            return np.zeros(0, dtype=np.int64)
+        postings = self._postings[column]
+        start, stop = postings.offsets[word_id], postings.offsets[word_id + 1]
+        return postings.rows[start:stop].astype(np.int64) * self._stride + postings.positions[start:stop]
+
+    def phrase_counts(self, column: str, phrase: str) -> pd.Series:
+        """
+        Counts the occurrences of `phrase` in the text column `column` of every section.
+        Case and punctuation are ignored.
+        :return: The number of occurrences, indexed by row, for the rows containing the phrase.
+        """
+        phrase_words = words(phrase)
+        if not phrase_words:
+            return pd.Series([], dtype=np.int64)
+        matches = self._occurrences(column, phrase_words[0])
+        for offset, word in enumerate(phrase_words[1:], start=1):
+            if not len(matches):
+                break
+            matches = matches[np.isin(matches + offset, self._occurrences(column, word), assume_unique=True)]
+        rows, counts = np.unique(matches // self._stride, return_counts=True)
+        return pd.Series(counts, index=rows)
+
+    def search(self, phrase: str, mode: str = "either") -> pd.DataFrame:
+        """
+        Finds the sections containing `phrase`.
+        :param phrase: Words to search for, in order.
+        :param mode: One of `SEARCH_MODES`. "removed" finds sections whose previous text contains the phrase but
+            whose current text does not, and "added" the reverse.
+        :return: The `previous` and `current` number of occurrences of the phrase in every matching section, indexed
+            by section and ranked by the number of occurrences.
+        """
+        counts = pd.DataFrame({column: self.phrase_counts(column, phrase) for column in TEXT_COLUMNS}) \
+            .fillna(0).astype(np.int64)
+        if mode in TEXT_COLUMNS:
+            counts = counts[counts[mode] > 0]
+        elif mode == "removed":
+            counts = counts[(counts["previous"] > 0) & (counts["current"] == 0)]
+        elif mode == "added":
+            counts = counts[(counts["current"] > 0) & (counts["previous"] == 0)]
+        elif mode != "either":
+            raise ValueError(f"Unknown search mode: {mode}")
+        counts = counts.assign(total=counts["previous"] + counts["current"]) \
+            .sort_values("total", ascending=False, kind="stable").drop(columns="total")
+        counts.index = pd.Index([self.keys[row] for row in counts.index], name="index")
+        return counts
+
+
+def _load_text_index(path: str) -> TextIndex:
+    store = open_store(path, STORE_PATH)
+    index = TextIndex.open(store) if store is not None else None
+    if index is None:
+        frame = load_dataset(path, list(TEXT_COLUMNS))
+        vocabulary, postings = build_postings({column: frame[column].tolist() for column in TEXT_COLUMNS})
+        index = TextIndex(frame.index.astype(str).tolist(), vocabulary, postings)
+    return index
+
+
+def text_index(path: str = DATA_PATH) -> TextIndex:
+    """
+    Returns the full-text index of the dataset at `path`.
+    The index written with the store is used if the store is up to date. Otherwise the index is built in memory,
+    once per version of the dataset.
+    """
+    return memoize("text_index", lambda: _load_text_index(path), path)
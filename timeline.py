@@ -0,0 +1,283 @@
+"""
+Versions of every section across several editions.
+
+The dataset holds two versions of every section, the one before the 2020 Revised Edition and the one after it.
+The timeline (`data_store/timeline.sqlite`) holds any number of versions of every section, in long format: one row
+per section and version date, with the link to that version on Statutes Online, indexed by section and date. Texts
+are stored once per distinct text, with their scores, and versions refer to their text by hash. A section which did
+not change between two editions therefore costs one more small row, not another copy of its text and scores.
+
+Both apps can compare any two dates of the timeline: the Section Explorer diffs the versions of a section in force on
+those dates, and the Graph Explorer charts every section between them (see `Timeline.comparison`).
+
+Start the timeline with the two versions of every section in `data.csv.gz`, then add versions, such as those of the
+`Historical/` pages of Statutes Online:
+
+    python timeline.py --import-dataset
+    python timeline.py versions.jsonl
+
+A version is an object with the fields `act_name`, `section` (or `index`, as in `ingest.py`), `date` (YYYY-MM-DD),
+`text` and `link`. Its text is cleaned and scored as in `ingest.py`.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import NamedTuple
+
+import pandas as pd
+
+from dataset import DATA_PATH, memoize
+from ipynb.helpers import clean_text
+from metrics import METRICS, add_deltas
+from sections import Section, explorer_url
+from store import STORE_PATH
+
+TIMELINE_FILE = "timeline.sqlite"
+
+TIMELINE_PATH = os.path.join(STORE_PATH, TIMELINE_FILE)
+
+# The date the 2020 Revised Edition came into force, which is the date of the current text in the dataset.
+REVISED_EDITION_DATE = "2021-12-31"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (hash TEXT PRIMARY KEY, text TEXT, metrics_version INTEGER, scores TEXT);
+CREATE TABLE IF NOT EXISTS versions (
+    section TEXT, date TEXT, act_name TEXT, link TEXT, hash TEXT,
+    PRIMARY KEY (section, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS versions_by_date ON versions (date, section);
+"""
+
+_historical_date = re.compile(r"/Historical/(\d{4})(\d{2})(\d{2})")
+
+
+class Version(NamedTuple):
+    date: str
+    act_name: str
+    link: str
+    hash: str
+
+
+def link_date(link: str, default: str = REVISED_EDITION_DATE) -> str:
+    """Returns the date of the version of a section at `link`, from its `Historical/` path, or `default`."""
+    match = _historical_date.search(link or "")
+    return "-".join(match.groups()) if match else default
+
+
+class Timeline:
+    """
+    The versions of every section, read from and written to a SQLite file.
+    The versions and scores are read into memory when the timeline is opened. Texts are read one at a time.
+    Instances are safe to share between threads.
+    """
+
+    def __init__(self, path: str = TIMELINE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._versions: pd.DataFrame | None = None
+        self._scores: pd.DataFrame | None = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+    def add_text(self, text: str, scores: dict | None = None) -> str:
+        """
+        Stores `text` if it is not stored yet, scoring it unless `scores` are given.
+        :return: The hash of the text.
+        """
+        from readability import METRICS_VERSION, score_text
+        from rescore import text_hash
+
+        hashed = text_hash(text)
+        with self._lock:
+            if self._connection.execute("SELECT 1 FROM texts WHERE hash = ?", (hashed,)).fetchone() is None:
+                scores = score_text(text) if scores is None else scores
+                self._connection.execute("INSERT INTO texts VALUES (?, ?, ?, ?)",
+                                         (hashed, text, METRICS_VERSION, json.dumps(scores)))
+        return hashed
+
+    def add_version(self, section: str, date: str, text: str, act_name: str = "", link: str = "",
+                    scores: dict | None = None):
+        """
+        Records the cleaned `text` of `section` as the version in force from `date`, replacing any version of that date.
+        :param scores: The scores of `text`, if they are known. Otherwise it is scored, unless it is already stored.
+        """
+        hashed = self.add_text(text, scores)
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?)",
+                                     (section, date, act_name, link, hashed))
+            self._versions = self._scores = None
+
+    def import_dataset(self, frame: pd.DataFrame) -> int:
+        """
+        Records the previous and current version of every section of the dataset, with their scores.
+        The date of every version is taken from its link (see `link_date`). If a key is repeated, its first row is used.
+        :return: The number of versions recorded.
+        """
+        count = 0
+        for key, row in frame[~frame.index.duplicated()].iterrows():
+            versions = []
+            for version in ("previous", "current"):
+                date = link_date(row[f"{version}_link"])
+                scores = {metric.key: row[getattr(metric, f"{version}_column")] for metric in METRICS.values()}
+                versions.append((date, row[version] if isinstance(row[version], str) else "", scores))
+            # The links of a few sections are swapped, so the earlier date is always given to the previous text.
+            dates = sorted({date for date, _, _ in versions})
+            if len(dates) == 1:
+                # Neither link dates the previous text, which is then in force from before every dated version.
+                dates.insert(0, "")
+            for (_, text, scores), date, version in zip(versions, dates, ("previous", "current")):
+                self.add_version(key, date, text, row["act_name"], row[f"{version}_link"], scores)
+                count += 1
+        self._connection.commit()
+        return count
+
+    def _load(self):
+        with self._lock:
+            if self._versions is None:
+                self._versions = pd.read_sql("SELECT section, date, act_name, link, hash FROM versions "
+                                             "ORDER BY section, date", self._connection)
+                texts = pd.read_sql("SELECT hash, scores FROM texts", self._connection)
+                scores = pd.DataFrame([json.loads(value) for value in texts["scores"]], index=texts["hash"])
+                self._scores = scores.reindex(columns=list(METRICS))
+            return self._versions, self._scores
+
+    def __len__(self) -> int:
+        return len(self._load()[0].index)
+
+    def dates(self) -> list[str]:
+        """Returns every date with a version of any section, in order."""
+        return sorted(self._load()[0]["date"].unique().tolist())
+
+    def versions(self, section: str) -> list[Version]:
+        """Returns the versions of `section`, in order of date."""
+        versions = self._load()[0]
+        rows = versions[versions["section"] == section]
+        return [Version(*values) for values in zip(rows["date"], rows["act_name"], rows["link"], rows["hash"])]
+
+    def text(self, hashed: str) -> str:
+        """Returns the text with the hash `hashed`."""
+        with self._lock:
+            return self._connection.execute("SELECT text FROM texts WHERE hash = ?", (hashed,)).fetchone()[0]
+
+    def scores(self, hashed: str) -> tuple[float, ...]:
+        """Returns the scores of the text with the hash `hashed`, in the order of `metrics.METRICS`."""
+        return tuple(self._load()[1].loc[hashed].tolist())
+
+    def as_at(self, date: str) -> pd.DataFrame:
+        """Returns the version of every section in force on `date`, indexed by section."""
+        versions = self._load()[0]
+        return versions[versions["date"] <= date].groupby("section", sort=False).last()
+
+    def comparison(self, from_date: str, to_date: str) -> pd.DataFrame:
+        """
+        Returns the sections in force on both dates, in the columns of the dataset: the version in force on
+        `from_date` as "previous", the version in force on `to_date` as "current", and the change between them as
+        `diff_` columns. The texts are not included; read them with `text`.
+        """
+        scores = self._load()[1]
+        columns = {}
+        for version, date in (("previous", from_date), ("current", to_date)):
+            versions = self.as_at(date)
+            columns[version] = versions
+            version_scores = scores.loc[versions["hash"]].set_axis(versions.index)
+            for metric in METRICS.values():
+                versions[getattr(metric, f"{version}_column")] = version_scores[metric.key]
+        previous, current = columns["previous"], columns["current"]
+        keys = previous.index.intersection(current.index, sort=False)
+        frame = pd.DataFrame({"act_name": current.loc[keys, "act_name"],
+                              "previous_link": previous.loc[keys, "link"],
+                              "current_link": current.loc[keys, "link"]}, index=keys)
+        for metric in METRICS.values():
+            frame[metric.previous_column] = previous.loc[keys, metric.previous_column]
+            frame[metric.current_column] = current.loc[keys, metric.current_column]
+        frame["url"] = [explorer_url(key, from_date, to_date) for key in keys]
+        frame.index.name = "index"
+        return add_deltas(frame)
+
+    def section(self, key: str, from_date: str, to_date: str) -> tuple[Section, str, str]:
+        """
+        Returns the section `key` comparing its versions in force on `from_date` and on `to_date`, with their texts.
+        Raises KeyError if the section has no version on or before `from_date`.
+        """
+        found = [None, None]
+        for version in self.versions(key):
+            for position, date in enumerate((from_date, to_date)):
+                if version.date <= date:
+                    found[position] = version
+        if found[0] is None:
+            raise KeyError(key)
+        previous, current = found
+        section = Section(key, current.act_name, previous.link, current.link, self.scores(previous.hash),
+                          self.scores(current.hash))
+        return section, self.text(previous.hash), self.text(current.hash)
+
+
+def open_timeline(path: str = TIMELINE_PATH) -> Timeline | None:
+    """Returns the timeline at `path`, opened once per version of the file, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    return memoize("timeline", lambda: Timeline(path), path)
+
+
+def comparison_data(from_date: str, to_date: str, path: str = TIMELINE_PATH) -> pd.DataFrame:
+    """
+    Returns `Timeline.comparison` of the timeline at `path` with the section as an `index` column, as the charts of
+    the Graph Explorer read it (see `charts.chart_data`). It is computed once per version of the timeline.
+    """
+    return memoize(("timeline_comparison", from_date, to_date),
+                   lambda: open_timeline(path).comparison(from_date, to_date).reset_index(), path)
+
+
+def add_versions(records, timeline: Timeline) -> int:
+    """
+    Cleans, scores and records versions of sections.
+    :param records: Versions as read by `ingest.read_records`.
+    :return: The number of versions recorded.
+    """
+    from ingest import section_key
+
+    count = 0
+    for record in records:
+        missing = [field for field in ("act_name", "date", "text") if not record.get(field)]
+        if missing:
+            raise ValueError(f'Version {record.get("index") or record.get("section")} is missing: {", ".join(missing)}')
+        timeline.add_version(section_key(record), record["date"], clean_text(record["text"]), record["act_name"],
+                             record.get("link", ""))
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ingest import read_records
+
+    parser = argparse.ArgumentParser(description="Record versions of sections in the PLUS Explorer timeline.")
+    parser.add_argument("source", nargs="?", help="A JSONL file, or a directory of .json files, of versions.")
+    parser.add_argument("--import-dataset", action="store_true",
+                        help="Record the previous and current version of every section in the dataset.")
+    parser.add_argument("--data", default=DATA_PATH, help="Path to the dataset.")
+    parser.add_argument("--timeline", default=TIMELINE_PATH, help="Path to the timeline.")
+    arguments = parser.parse_args()
+
+    with Timeline(arguments.timeline) as timeline:
+        if arguments.import_dataset:
+            print(f"{timeline.import_dataset(pd.read_csv(arguments.data, index_col=0))} versions imported")
+        if arguments.source:
+            print(f"{add_versions(read_records(arguments.source), timeline)} versions recorded")
+        print(f"{len(timeline)} versions of sections on {len(timeline.dates())} dates")
@@ -0,0 +1,188 @@
+"""
+Opt-in timing of the stages of a rerun of the apps.
+
+Timing is enabled for every session by setting the environment variable `PLUS_TIMING=1`, or for a single session by
+adding `?timing=1` to the URL of a page. The apps then time every named stage of a rerun, such as loading the data or
+diffing a section, with the section or metric it was for and the size of what it produced. The latest
+`MAX_SAMPLES` timings of every stage are kept in memory for the whole process. Only a page opened with `?timing=1`
+shows their median and 95th percentile at the bottom, whether or not `PLUS_TIMING` is set. Set `PLUS_TIMING_LOG` to
+a path to also append every rerun to that file as a line of JSON.
+
+Labels are shown to whoever opens a page with `?timing=1`, so stages of free text, such as a search, have no label.
+
+When timing is disabled, `stage` returns a shared object which does nothing, so an instrumented stage costs one
+function call and one attribute lookup.
+
+    with stage("diff", section) as timed:
+        diff = get_diff(previous_text, current_text)
+        if timed:
+            timed.size = len(diff.markdown)
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+
+ENABLED = os.environ.get("PLUS_TIMING", "") not in ("", "0")
+
+LOG_PATH = os.environ.get("PLUS_TIMING_LOG")
+
+QUERY_PARAM = "timing"
+
+# Number of timings kept for every stage and label, and number of labels kept for every stage.
+# Timings of further labels are kept under the label "other".
+MAX_SAMPLES = 1000
+MAX_LABELS = 1000
+
+_lock = threading.Lock()
+_samples: dict[tuple[str, str | None], deque] = {}
+_labels: dict[str, int] = defaultdict(int)
+# Streamlit runs the script of every session in its own thread.
+_local = threading.local()
+
+
+class _Stage:
+    __slots__ = ("name", "label", "size", "start")
+
+    def __init__(self, name: str, label: str | None):
+        self.name = name
+        self.label = label
+        self.size = None
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        with _lock:
+            samples = _samples.get((self.name, self.label))
+            if samples is None:
+                label = self.label if _labels[self.name] < MAX_LABELS else "other"
+                samples = _samples.get((self.name, label))
+                if samples is None:
+                    samples = _samples[(self.name, label)] = deque(maxlen=MAX_SAMPLES)
+                    _labels[self.name] += 1
+            samples.append((seconds, self.size))
+        _local.run["stages"].append({"stage": self.name, "label": self.label, "seconds": seconds, "size": self.size})
+        return False
+
+
+class _DisabledStage:
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_disabled = _DisabledStage()
+
+
+def start_run(app: str, query_params: dict) -> bool:
+    """
+    Starts timing a rerun of `app`, if timing is enabled for every session or by the query params of this one.
+    :param app: Name of the app, such as "explorer".
+    :param query_params: The query params of the page, as returned by `st.experimental_get_query_params`.
+    :return: Whether the rerun is timed. Only a rerun requested by the query params shows the timings
+        (see `write_summary`).
+    """
+    _local.requested = _requested(query_params)
+    enabled = ENABLED or _local.requested
+    _local.run = {"app": app, "time": time.time(), "stages": []} if enabled else None
+    return enabled
+
+
+def _requested(query_params: dict) -> bool:
+    return query_params.get(QUERY_PARAM, ["0"])[0] not in ("", "0")
+
+
+def query_params(page_params: dict | None = None) -> dict:
+    """
+    Returns the query params which keep the session showing its timings, to add to any query params set by the app.
+    :param page_params: The query params of the page, as returned by `st.experimental_get_query_params`. Pass them
+        in callbacks, which run before the rerun is started, so the current rerun cannot tell if it was requested.
+    """
+    requested = _requested(page_params) if page_params is not None else getattr(_local, "requested", False)
+    return {QUERY_PARAM: "1"} if requested else {}
+
+
+def enabled() -> bool:
+    """Returns True if the current rerun is timed."""
+    return getattr(_local, "run", None) is not None
+
+
+def stage(name: str, label: str | None = None):
+    """
+    Returns a context manager timing the stage `name` of the current rerun, if it is timed.
+    The context manager is false if the rerun is not timed. Otherwise, set its `size` to record the size of what the
+    stage produced, such as the number of characters of a diff.
+    :param name: Name of the stage, such as "diff".
+    :param label: The section or metric the stage is for. Never free text typed by a user, as labels are shown to
+        other sessions.
+    """
+    if getattr(_local, "run", None) is None:
+        return _disabled
+    return _Stage(name, label)
+
+
+def finish_run():
+    """Ends the current rerun, and appends it to `PLUS_TIMING_LOG` if it is set."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return
+    run["seconds"] = sum(entry["seconds"] for entry in run["stages"])
+    if LOG_PATH:
+        with _lock, open(LOG_PATH, "a", encoding="utf-8") as file:
+            file.write(json.dumps(run) + "\n")
+    _local.run = None
+
+
+def summary(by_label: bool = False) -> pd.DataFrame:
+    """
+    Returns the number of timings, the median, 95th percentile and maximum time in milliseconds, and the mean size
+    of every stage, from the timings kept in memory.
+    :param by_label: Whether to summarise every section or metric of a stage separately.
+    """
+    with _lock:
+        samples = {key: list(values) for key, values in _samples.items()}
+    grouped = defaultdict(list)
+    for (name, label), values in samples.items():
+        grouped[(name, label) if by_label else (name,)].extend(values)
+
+    rows = []
+    for key, values in grouped.items():
+        seconds = np.array([value[0] for value in values]) * 1000
+        sizes = [value[1] for value in values if value[1] is not None]
+        rows.append((*key, len(values), np.percentile(seconds, 50), np.percentile(seconds, 95), seconds.max(),
+                     float(np.mean(sizes)) if sizes else None))
+    columns = ["stage", "label"] if by_label else ["stage"]
+    return pd.DataFrame(rows, columns=columns + ["count", "p50_ms", "p95_ms", "max_ms", "mean_size"]) \
+        .sort_values(columns, ignore_index=True)
+
+
+def write_summary():
+    """Shows the timings of every stage on the page, if the query params of the page asked for them."""
+    if not enabled() or not getattr(_local, "requested", False):
+        return
+    import streamlit as st
+
+    st.write("## Timings")
+    st.caption(f"The latest {MAX_SAMPLES} timings of every stage in this process. Sizes are in characters or bytes.")
+    st.dataframe(summary())
+    with st.expander("By section or metric"):
+        st.dataframe(summary(by_label=True))